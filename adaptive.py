@@ -0,0 +1,132 @@
+# adaptive.py
+import json
+import pandas as pd
+from pathlib import Path
+from utils import stratified_order, bootstrap_ci, paired_model_comparison, format_ci
+from evaluate_segmentation_iou import robust_json_parser as parse_bbox_prediction, match_box, calculate_iou
+from evaluate_spatial_accuracy import robust_json_parser as parse_coord_prediction, match_point, calculate_distance
+from evaluate_spatial_accuracy import PIXEL_TO_NM, THRESHOLD_PX
+
+DEFAULT_SAMPLING = {
+    "batch_size": 8,            # slices per batch; every model is queried on each slice
+    "min_slices": 16,           # never stop before this many slices
+    "max_slices": None,         # hard cap (None = whole dataset)
+    # Stop once every model's 95% CI is at most this wide for each tracked metric
+    "target_ci_width": {"iou": 0.10, "recall": 0.10, "error_nm": 50.0},
+    "stop_on_separation": True, # ...or once every model pair differs significantly on the primary metric
+    "depth_bins": 4,
+    "seed": 0,
+    "n_resamples": 2000,        # per-batch checks; the final evaluation uses the full resample count
+}
+
+# IoU at or above which a GT box counts as found
+IOU_HIT = 0.5
+
+class AdaptiveSampler:
+    """
+    Early-stopping slice sampler for run_all_models. Slices are visited in stratified order
+    (tomogram x z-depth, see utils.stratified_order) and scored after each batch with the
+    evaluators' matching rules: IoU and recall (IoU >= 0.5) for bbox datasets, recall
+    (HIT < 150 px) and coordinate error for coordinate datasets. Sampling stops when every
+    model's bootstrap CI is narrower than its target, or when all models are clearly
+    separated on the primary metric.
+    """
+
+    def __init__(self, df, models, config=None):
+        self.config = {**DEFAULT_SAMPLING, **(config or {})}
+        self.config["target_ci_width"] = {**DEFAULT_SAMPLING["target_ci_width"],
+                                          **self.config["target_ci_width"]}
+        if "gt_bboxes" in df.columns:
+            self.kind, self.metrics, self.primary = "bbox", ["iou", "recall"], "iou"
+        elif "gt_coords" in df.columns:
+            self.kind, self.metrics, self.primary = "point", ["recall", "error_nm"], "recall"
+        else:
+            raise ValueError("Adaptive sampling needs a gt_bboxes or gt_coords column to score against")
+
+        self.models = list(models)
+        self.order = stratified_order(df, depth_bins=self.config["depth_bins"], seed=self.config["seed"])
+        if self.config["max_slices"]:
+            self.order = self.order[:self.config["max_slices"]]
+        self.batch_size = self.config["batch_size"]
+        self.scores = []
+        self.history = []
+        self.sampled = 0
+        self.stop_reason = None
+
+    def score_rows(self, summary_df, indices):
+        """
+        Per-(model, image, label) scores for the given rows; unparseable answers are skipped
+        like the evaluators do.
+        """
+        rows = []
+        for i in indices:
+            row = summary_df.loc[i]
+            gt_dict = json.loads(row["gt_bboxes" if self.kind == "bbox" else "gt_coords"])
+            for model in self.models:
+                if self.kind == "bbox":
+                    predictions = parse_bbox_prediction(row[f"{model}_predictions"])
+                else:
+                    predictions = parse_coord_prediction(row[f"{model}_predictions"])
+                if not predictions:
+                    continue
+                for gt_label, gt_geom in gt_dict.items():
+                    score = {"model": model, "image": row["image_id"], "label": gt_label}
+                    if self.kind == "bbox":
+                        box = match_box(predictions, gt_label, gt_geom)
+                        score["iou"] = calculate_iou(gt_geom, box) if box else 0.0
+                        score["recall"] = float(score["iou"] >= IOU_HIT)
+                    else:
+                        point = match_point(predictions, gt_label, gt_geom)
+                        dist = calculate_distance(gt_geom, point) if point else None
+                        score["recall"] = float(dist is not None and dist < THRESHOLD_PX)
+                        score["error_nm"] = dist * PIXEL_TO_NM if dist is not None else float("nan")
+                    rows.append(score)
+        return rows
+
+    def update(self, summary_df, batch):
+        """
+        Scores a finished batch, prints running estimates and returns True to stop sampling.
+        """
+        self.scores.extend(self.score_rows(summary_df, batch))
+        self.sampled += len(batch)
+        scores_df = pd.DataFrame(self.scores)
+        n_resamples = self.config["n_resamples"]
+
+        print(f"\n--- Adaptive sampling: {self.sampled}/{len(self.order)} slices ---")
+        precise = not scores_df.empty
+        for model in self.models:
+            model_scores = scores_df[scores_df["model"] == model] if not scores_df.empty else scores_df
+            line = []
+            for metric in self.metrics:
+                values = model_scores[metric] if metric in model_scores else []
+                point, lower, upper = bootstrap_ci(values, n_resamples=n_resamples)
+                width = upper - lower
+                if not width <= self.config["target_ci_width"][metric]:
+                    precise = False  # also catches NaN width (no parseable answers yet)
+                self.history.append({"slices": self.sampled, "model": model, "metric": metric,
+                                     "mean": point, "lower": lower, "upper": upper, "ci_width": width})
+                scale, unit = (1, " nm") if metric == "error_nm" else (100, "%")
+                line.append(f"{metric} {format_ci(point, lower, upper, scale=scale, unit=unit)}")
+            print(f" {model.upper():<8} | " + " | ".join(line))
+
+        if self.sampled < self.config["min_slices"] or self.sampled >= len(self.order):
+            return False
+        if precise:
+            self.stop_reason = "ci_width"
+        elif self.config["stop_on_separation"] and len(self.models) > 1:
+            comparisons = paired_model_comparison(scores_df, ["image", "label"], self.primary, n_resamples=n_resamples)
+            if len(comparisons) == len(self.models) * (len(self.models) - 1) // 2 and all(
+                    c["lower"] > 0 or c["upper"] < 0 for c in comparisons):
+                self.stop_reason = "separated"
+        if self.stop_reason:
+            print(f" Early stop after {self.sampled} slices ({self.stop_reason})")
+        return self.stop_reason is not None
+
+    def write_report(self, experiment_dir):
+        """
+        Saves the per-batch running estimates to sampling_report.csv.
+        """
+        report_file = Path(experiment_dir) / "sampling_report.csv"
+        pd.DataFrame(self.history).to_csv(report_file, index=False)
+        print(f" Sampling report saved: {report_file}")
+        return report_file
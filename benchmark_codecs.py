@@ -0,0 +1,119 @@
+# benchmark_codecs.py
+import time
+import base64
+import pandas as pd
+from pathlib import Path
+from utils import encode_image, encoding_tag
+from run import run_all_models, load_run_state
+from evaluate_segmentation_iou import evaluate_segmentation_performance
+from evaluate_spatial_accuracy import evaluate_coordinate_errors
+
+# Codec/quality settings swept by default; None keeps the PNG on disk unchanged
+DEFAULT_CODEC_GRID = [
+    None,
+    {"codec": "png", "compress_level": 9},
+    {"codec": "webp", "lossless": True},
+    {"codec": "webp", "quality": 90},
+    {"codec": "webp", "quality": 75},
+    {"codec": "jpeg", "quality": 95},
+    {"codec": "jpeg", "quality": 85},
+    {"codec": "jpeg", "quality": 70},
+]
+
+MODELS = ['openai', 'gemini', 'claude']
+
+def measure_payloads(image_paths, encoding):
+    """
+    Encodes every slice with one setting and returns mean raw/base64 payload bytes
+    and mean encode time in milliseconds.
+    """
+    raw_sizes, b64_sizes, encode_ms = [], [], []
+    for path in image_paths:
+        start = time.perf_counter()
+        img_bytes, _ = encode_image(path, encoding)
+        b64 = base64.b64encode(img_bytes)
+        encode_ms.append((time.perf_counter() - start) * 1000)
+        raw_sizes.append(len(img_bytes))
+        b64_sizes.append(len(b64))
+    n = len(image_paths)
+    return sum(raw_sizes) / n, sum(b64_sizes) / n, sum(encode_ms) / n
+
+def benchmark_codecs(experiment_name, dataset_csv, openai_client=None, gemini_model=None, claude_client=None,
+                     prompt_text=None, output_schema=None, codec_grid=DEFAULT_CODEC_GRID, eval_mode="Segmentation",
+                     budget=None, timeouts=None):
+    """
+    Sweeps image codec and quality settings over a dataset.
+    Always reports payload bytes (raw and base64) and encode time per setting. When clients
+    and a prompt are given, it also runs inference with each setting and reports per-model
+    request latency plus mean IoU (Segmentation) or coordinate error (Coordinate Detection)
+    from the existing evaluators, so the smallest encoding that keeps accuracy can be chosen.
+    budget (optional RunBudget) is shared by all inference sweeps; the benchmark stops at the
+    first sweep that runs out.
+    """
+    df = pd.read_csv(dataset_csv)
+    image_paths = df["image_path"].unique().tolist()
+    run_inference = prompt_text is not None and None not in (openai_client, gemini_model, claude_client)
+
+    bench_dir = Path("results") / f"{experiment_name}_CODEC_BENCHMARK"
+    bench_dir.mkdir(parents=True, exist_ok=True)
+
+    rows = []
+    baseline_b64 = None
+    for encoding in codec_grid:
+        tag = "original" if encoding is None else encoding_tag(encoding)
+        raw_bytes, b64_bytes, encode_ms = measure_payloads(image_paths, encoding)
+        baseline_b64 = baseline_b64 or b64_bytes
+        row = {
+            "encoding": tag,
+            "payload_bytes": round(raw_bytes),
+            "base64_bytes": round(b64_bytes),
+            "size_vs_original": b64_bytes / baseline_b64,
+            "encode_ms": encode_ms,
+        }
+        print(f"[{tag:<14}] payload {raw_bytes/1024:8.1f} KiB | base64 {b64_bytes/1024:8.1f} KiB | encode {encode_ms:6.1f} ms")
+
+        if run_inference:
+            encodings = {model: encoding for model in MODELS}
+            summary_path = run_all_models(
+                openai_client=openai_client,
+                gemini_model=gemini_model,
+                claude_client=claude_client,
+                prompt_text=prompt_text,
+                experiment_name=f"{experiment_name}_CODEC_BENCHMARK/{tag}",
+                dataset_csv=dataset_csv,
+                output_schema=output_schema,
+                encodings=encodings,
+                budget=budget,
+                timeouts=timeouts
+            )
+            if load_run_state(Path(summary_path).parent).get("status") == "budget_exhausted":
+                print(f" Budget exhausted during the '{tag}' sweep; remaining settings skipped.")
+                rows.append(row)
+                break
+            summary_df = pd.read_csv(summary_path)
+            for model in MODELS:
+                row[f"{model}_latency_s"] = summary_df[f"{model}_latency_s"].mean()
+
+            if eval_mode == "Segmentation":
+                scores = evaluate_segmentation_performance(summary_path)
+                metric, label = "iou", "mean_iou"
+            else:
+                scores = evaluate_coordinate_errors(summary_path)
+                metric, label = "error_nm", "mean_error_nm"
+
+            if scores is not None and not scores.empty:
+                for model, value in scores.groupby("model")[metric].mean().items():
+                    row[f"{model}_{label}"] = value
+
+        rows.append(row)
+
+    report_df = pd.DataFrame(rows)
+    report_file = bench_dir / "codec_benchmark.csv"
+    report_df.to_csv(report_file, index=False)
+
+    print("\n" + "=" * 80)
+    print("IMAGE CODEC BENCHMARK")
+    print("=" * 80)
+    print(report_df.to_string(index=False))
+    print(f"\n Codec benchmark saved: {report_file}")
+    return report_file
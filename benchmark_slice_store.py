@@ -0,0 +1,109 @@
+# benchmark_slice_store.py
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from utils import SharedSliceStore
+
+DEMO_IMAGES = ["demo_dataset/images/z187.png", "demo_dataset/images/z197.png", "demo_dataset/images/z207.png"]
+Z_WINDOW = 2  # Each task reads its slice plus +/-2 neighbours, like z-averaging does
+
+def memory_status():
+    """
+    Current process memory from /proc (Linux): private (anonymous) RSS, shared-memory and
+    file-backed RSS (where shm / mmap stores live) and peak RSS, in MiB.
+    """
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("RssAnon", "RssShmem", "RssFile", "VmHWM"):
+                fields[key] = int(value.split()[0]) / 1024
+    return fields
+
+def build_stack_dir(n_slices, out_dir):
+    """
+    Creates an n-slice stack (z0000.png ...) by symlinking the demo slices cyclically.
+    """
+    paths = []
+    for z in range(n_slices):
+        path = Path(out_dir) / f"z{z:04d}.png"
+        if not path.exists():
+            os.symlink(os.path.abspath(DEMO_IMAGES[z % len(DEMO_IMAGES)]), path)
+        paths.append(str(path))
+    return paths
+
+def process_slices(stack, indices):
+    """
+    Stand-in workload: z-window mean for each assigned slice.
+    """
+    total = 0.0
+    for i in indices:
+        window = stack[max(0, i - Z_WINDOW):i + Z_WINDOW + 1]
+        total += float(window.mean())
+    return total
+
+def per_worker_load_task(paths, indices):
+    # Baseline: every worker decodes the full stack on its own
+    start = time.perf_counter()
+    stack = np.stack([np.asarray(Image.open(p).convert("L")) for p in paths])
+    process_slices(stack, indices)
+    return time.perf_counter() - start, memory_status()
+
+def shared_store_task(spec, indices):
+    # Workers attach by name and read the coordinator's buffer without copying
+    start = time.perf_counter()
+    store = SharedSliceStore.attach(spec)
+    process_slices(store.stack, indices)
+    elapsed = time.perf_counter() - start
+    status = memory_status()
+    store.close()
+    return elapsed, status
+
+def report(label, wall, results, n_slices):
+    anon = [status["RssAnon"] for _, status in results]
+    shared = [status.get("RssShmem", 0.0) + status.get("RssFile", 0.0) for _, status in results]
+    peak = [status["VmHWM"] for _, status in results]
+    print(f"{label:<22} | {wall:8.2f} s | {n_slices / wall:8.1f} slices/s | "
+          f"private RSS/worker {np.mean(anon):8.1f} MiB | shared+file RSS/worker {np.mean(shared):8.1f} MiB | "
+          f"peak RSS/worker {np.mean(peak):8.1f} MiB")
+
+def benchmark_slice_store(n_slices=500, workers=4, backend="shm"):
+    """
+    Compares per-worker PNG loading against one shared store on an n-slice stack:
+    wall time, throughput and per-worker memory (private vs. shared pages).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = build_stack_dir(n_slices, tmp)
+        shares = [list(range(w, n_slices, workers)) for w in range(workers)]
+
+        print(f"Stack: {n_slices} slices | workers: {workers} | backend: {backend}")
+        print("-" * 140)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(per_worker_load_task, [paths] * workers, shares))
+        report("per-worker loading", time.perf_counter() - start, results, n_slices)
+
+        start = time.perf_counter()
+        with SharedSliceStore.create(paths, backend=backend, mmap_dir=tmp) as store:
+            load_time = time.perf_counter() - start
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(shared_store_task, [store.spec] * workers, shares))
+            wall = time.perf_counter() - start
+        report(f"shared store ({backend})", wall, results, n_slices)
+        print(f"  (coordinator decode into store: {load_time:.2f} s, "
+              f"buffer size {n_slices * store.spec['shape'][1] * store.spec['shape'][2] / 2**20:.1f} MiB)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared-memory slice store benchmark")
+    parser.add_argument("--slices", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backend", choices=["shm", "mmap"], default="shm")
+    args = parser.parse_args()
+
+    benchmark_slice_store(n_slices=args.slices, workers=args.workers, backend=args.backend)
@@ -0,0 +1,258 @@
+# cascade.py
+import time
+import pandas as pd
+from pathlib import Path
+from PIL import Image
+from run import build_model_registry, MODEL_TIERS
+from planner import DEFAULT_LATENCY_S, calibrate_from_history
+from utils import (estimate_text_tokens, estimate_image_tokens, estimate_call_cost,
+                   parse_z_index, tomogram_key, RunBudget, BudgetExceeded)
+from evaluate_segmentation_iou import calculate_iou, get_enclosing_box
+from evaluate_spatial_accuracy import calculate_distance
+
+COORD_MAX = 1010  # Valid pixel range is 0-1010 on the 1011-scale slices
+
+def normalize_prediction(preds):
+    """
+    Converts a model answer into {label: [ymin, xmin, ymax, xmax]} or {label: [y, x]}.
+    Returns None if the answer does not parse or fails the range/ordering sanity checks.
+    """
+    if not isinstance(preds, dict) or not preds:
+        return None
+
+    normalized = {}
+    for label, value in preds.items():
+        if isinstance(value, list) and value and isinstance(value[0], list):
+            # Multiple boxes for one label collapse to their enclosing box
+            value = get_enclosing_box(value)
+        if not isinstance(value, list) or len(value) not in (2, 4):
+            return None
+        if not all(isinstance(v, (int, float)) and 0 <= v <= COORD_MAX for v in value):
+            return None
+        if len(value) == 4 and (value[0] >= value[2] or value[1] >= value[3]):
+            return None
+        normalized[str(label).lower()] = list(value)
+    return normalized
+
+def geometries_agree(geom_a, geom_b, min_iou, max_px):
+    """
+    Boxes agree when their IoU reaches min_iou; points when they are within max_px.
+    """
+    if len(geom_a) != len(geom_b):
+        return False
+    if len(geom_a) == 4:
+        return calculate_iou(geom_a, geom_b) >= min_iou
+    return calculate_distance(geom_a, geom_b) <= max_px
+
+def predictions_agree(pred_a, pred_b, min_iou, max_px):
+    """
+    Two normalized predictions agree if they report the same labels with agreeing geometry.
+    """
+    if set(pred_a) != set(pred_b):
+        return False
+    return all(geometries_agree(pred_a[label], pred_b[label], min_iou, max_px) for label in pred_a)
+
+def is_continuous(pred, neighbour, min_iou, max_px):
+    """
+    3D-continuity check against the accepted answer of the previous slice in the tomogram.
+    Only labels present in both slices are compared.
+    """
+    if neighbour is None:
+        return True
+    shared = set(pred) & set(neighbour)
+    return all(geometries_agree(pred[label], neighbour[label], min_iou, max_px) for label in shared)
+
+def consensus_prediction(predictions):
+    """
+    Element-wise mean of agreeing predictions, rounded to integer pixels.
+    """
+    labels = predictions[0].keys()
+    return {
+        label: [round(sum(p[label][i] for p in predictions) / len(predictions)) for i in range(len(predictions[0][label]))]
+        for label in labels
+    }
+
+def run_cascade(openai_client, cheap_gemini_model, gemini_model, claude_client, prompt_text, experiment_name,
+                dataset_csv="demo_dataset/annotations_segmenetation.csv", output_schema=None,
+                cheap_models=("openai", "gemini", "claude"), escalation_order=("gemini", "openai", "claude"),
+                agreement_iou=0.5, agreement_px=50, continuity_iou=0.3, continuity_px=150, continuity_max_gap=20,
+                encodings=None, timeouts=None, budget=None):
+    """
+    Cost/latency-aware routing: every slice is first sent to the cheap tier. The answer is
+    accepted if all cheap models parse, pass the sanity checks (range 0-1010, 3D continuity
+    with the previous slice) and agree with each other; otherwise the flagship models are
+    tried in escalation_order until one passes. Writes cascade_summary.csv and
+    cascade_report.csv next to the regular experiment outputs.
+    encodings and timeouts are passed to build_model_registry as in run_all_models.
+    budget (optional RunBudget) is checked before every call; routing stops once it runs out
+    and the slices visited so far are saved and reported.
+    """
+    if not Path(dataset_csv).exists():
+        raise FileNotFoundError(f"Dataset not found: {dataset_csv}")
+
+    df = pd.read_csv(dataset_csv)
+    experiment_dir = Path("results") / experiment_name
+    experiment_dir.mkdir(parents=True, exist_ok=True)
+
+    cheap = build_model_registry(openai_client, cheap_gemini_model, claude_client, prompt_text, output_schema,
+                                 tier="cheap", encodings=encodings, timeouts=timeouts)
+    flagship = build_model_registry(openai_client, gemini_model, claude_client, prompt_text, output_schema,
+                                    tier="flagship", encodings=encodings, timeouts=timeouts)
+    prompt_tokens = estimate_text_tokens(prompt_text)
+    budget = budget or RunBudget()
+
+    calls = []
+
+    def timed_call(tier, model_name, infer_fn, image_path, image_size):
+        full_name = MODEL_TIERS[tier][model_name]
+        input_tokens = prompt_tokens + estimate_image_tokens(full_name, *image_size)
+        # Raises BudgetExceeded before the request is sent
+        budget.check(full_name, input_tokens)
+
+        start = time.perf_counter()
+        try:
+            preds = infer_fn(image_path)
+        except Exception as e:
+            print(f"Error for {image_path} with {tier}/{model_name}: {e}")
+            preds = f"ERROR: {e}"
+        latency = time.perf_counter() - start
+
+        cost = budget.charge(full_name, input_tokens, estimate_text_tokens(preds))
+        calls.append({"tier": tier, "model": full_name, "image_path": image_path, "latency_s": latency, "cost_usd": cost})
+        return preds, latency, cost
+
+    # Visit slices in z order within each tomogram so continuity uses the right neighbour
+    df["_tomogram"] = df.apply(tomogram_key, axis=1)
+    df["_z"] = df["image_path"].apply(parse_z_index)
+    order = df.sort_values(["_tomogram", "_z"]).index
+
+    records = {}
+    previous = {}  # tomogram -> (z, accepted prediction)
+    stopped_at = None
+
+    print(f"\n--- Cascade Routing: cheap={list(cheap_models)} -> flagship={list(escalation_order)} ---")
+    for n, idx in enumerate(order):
+        row = df.loc[idx]
+        image_path = row["image_path"]
+        with Image.open(image_path) as img:
+            image_size = img.size
+
+        neighbour = None
+        prev_z, prev_pred = previous.get(row["_tomogram"], (None, None))
+        if prev_pred is not None and row["_z"] is not None and abs(row["_z"] - prev_z) <= continuity_max_gap:
+            neighbour = prev_pred
+
+        try:
+            row_cost, row_latency = 0.0, 0.0
+            valid = []
+            for model_name in cheap_models:
+                preds, latency, cost = timed_call("cheap", model_name, cheap[model_name], image_path, image_size)
+                row_cost += cost
+                row_latency += latency
+                norm = normalize_prediction(preds)
+                if norm is not None and is_continuous(norm, neighbour, continuity_iou, continuity_px):
+                    valid.append(norm)
+
+            agreed = len(valid) == len(cheap_models) and all(
+                predictions_agree(valid[0], other, agreement_iou, agreement_px) for other in valid[1:]
+            )
+
+            if agreed:
+                accepted, source, escalated = consensus_prediction(valid), "cheap:consensus", False
+            else:
+                accepted, source, escalated = None, "failed", True
+                fallback = None
+                for model_name in escalation_order:
+                    preds, latency, cost = timed_call("flagship", model_name, flagship[model_name], image_path, image_size)
+                    row_cost += cost
+                    row_latency += latency
+                    norm = normalize_prediction(preds)
+                    if norm is None:
+                        fallback = fallback or preds
+                        continue
+                    if is_continuous(norm, neighbour, continuity_iou, continuity_px):
+                        accepted, source = norm, f"flagship:{model_name}"
+                        break
+                    # Parseable but discontinuous: keep as a last resort
+                    if not isinstance(fallback, dict):
+                        fallback = norm
+                if accepted is None:
+                    accepted = fallback
+        except BudgetExceeded as e:
+            print(f"\n Budget stop before {image_path}: {e}")
+            stopped_at = image_path
+            break
+
+        status = "ESCALATED" if escalated else "CHEAP"
+        print(f"  [{n+1}/{len(df)}] {image_path}: {status:<9} -> {source}")
+
+        if isinstance(accepted, dict):
+            previous[row["_tomogram"]] = (row["_z"], accepted)
+        records[idx] = {"cascade_predictions": accepted, "cascade_source": source, "cascade_escalated": escalated,
+                        "cascade_cost_usd": row_cost, "cascade_latency_s": row_latency}
+
+    summary_df = df.drop(columns=["_tomogram", "_z"]).join(pd.DataFrame.from_dict(records, orient="index"))
+    summary_file = experiment_dir / "cascade_summary.csv"
+    summary_df.to_csv(summary_file, index=False)
+
+    # --- Report: cascade vs. sending every slice to all three flagship models ---
+    # Only slices routed before a budget stop are compared
+    visited = [idx for idx in order if idx in records]
+    calls_df = pd.DataFrame(calls, columns=["tier", "model", "image_path", "latency_s", "cost_usd"])
+    flagship_calls = calls_df[calls_df["tier"] == "flagship"]
+    mean_latency = flagship_calls.groupby("model")["latency_s"].mean()
+
+    baseline_cost = 0.0
+    for idx in visited:
+        with Image.open(df.at[idx, "image_path"]) as img:
+            image_size = img.size
+        output_tokens = estimate_text_tokens(records[idx]["cascade_predictions"])
+        for full_name in MODEL_TIERS["flagship"].values():
+            input_tokens = prompt_tokens + estimate_image_tokens(full_name, *image_size)
+            baseline_cost += estimate_call_cost(full_name, input_tokens, output_tokens)
+
+    # Latency baseline: observed flagship latency where available, else a previous full run
+    # in this experiment, else the planner defaults (typical when nothing escalates)
+    history = calibrate_from_history(experiment_dir / "all_models_summary.csv")
+    baseline_sources = {}
+    per_slice_latency = 0.0
+    for provider, full_name in MODEL_TIERS["flagship"].items():
+        if full_name in mean_latency:
+            latency, baseline_sources[provider] = mean_latency[full_name], "observed"
+        elif "latency_s" in history.get(provider, {}):
+            latency, baseline_sources[provider] = history[provider]["latency_s"], "history"
+        else:
+            latency, baseline_sources[provider] = DEFAULT_LATENCY_S[provider], "default"
+        per_slice_latency += latency
+    baseline_latency = per_slice_latency * len(visited)
+
+    escalated_fraction = sum(records[idx]["cascade_escalated"] for idx in visited) / len(visited) if visited else 0.0
+    cascade_cost = calls_df["cost_usd"].sum()
+    cascade_latency = calls_df["latency_s"].sum()
+
+    report = {
+        "slices": len(visited),
+        "escalated_fraction": escalated_fraction,
+        "cheap_calls": int((calls_df["tier"] == "cheap").sum()),
+        "flagship_calls": len(flagship_calls),
+        "cascade_cost_usd": cascade_cost,
+        "baseline_cost_usd": baseline_cost,
+        "cascade_latency_s": cascade_latency,
+        "baseline_latency_s": baseline_latency,
+        "baseline_latency_source": ",".join(f"{p}:{src}" for p, src in baseline_sources.items()),
+    }
+    pd.DataFrame([report]).to_csv(experiment_dir / "cascade_report.csv", index=False)
+
+    print("\n" + "=" * 60)
+    print("CASCADE ROUTING REPORT")
+    print("=" * 60)
+    print(f" - Slices: {len(visited)}/{len(df)} | Escalated: {escalated_fraction*100:.1f}%")
+    print(f" - Calls: {report['cheap_calls']} cheap, {report['flagship_calls']} flagship")
+    print(f" - Est. Cost: ${cascade_cost:.4f} (all-models baseline: ${baseline_cost:.4f})")
+    estimated = [p for p, src in baseline_sources.items() if src != "observed"]
+    note = f", estimated for {', '.join(estimated)}" if estimated else ""
+    print(f" - Latency: {cascade_latency:.1f}s (all-models baseline: {baseline_latency:.1f}s{note})")
+    if stopped_at:
+        print(f" - Budget stop at {stopped_at}: {len(df) - len(visited)} slices not routed")
+    print(f"\n Cascade summary saved: {summary_file}")
+    return summary_file
@@ -3,6 +3,7 @@ import json
 import re
 import ast
 from pathlib import Path
+from utils import bootstrap_ci, paired_model_comparison, format_ci, stage
 
 # Synonym library to map LLM labels to expert ground truth labels
 SYNONYMS = {
@@ -77,64 +78,89 @@ def calculate_iou(boxA, boxB):
 
     return interArea / float(boxAArea + boxBArea - interArea)
 
+def match_box(predictions, gt_label, gt_box):
+    """
+    Returns the predicted box for gt_label that the IoU evaluator would score (best IoU).
+    """
+    keywords = SYNONYMS.get(gt_label, [gt_label])
+    best_box, best_iou = None, -1.0
+    for p_label, p_data in predictions.items():
+        if any(word in p_label.lower() for word in keywords):
+            box = get_enclosing_box(p_data)
+            if box:
+                iou = calculate_iou(gt_box, box)
+                if iou > best_iou:
+                    best_box, best_iou = box, iou
+    return best_box
+
 def evaluate_segmentation_performance(summary_path, example_ids=['z187']):
     """
     Main evaluation pipeline. Separates results into Generalization and Memorization.
+    Returns the per-(model, image, label) IoU table.
     """
     if not Path(summary_path).exists():
         print(f"File not found: {summary_path}")
         return
 
-    df = pd.read_csv(summary_path)
-    MODELS = ['openai', 'gemini', 'claude']
+    with stage("load"):
+        df = pd.read_csv(summary_path)
+    MODELS = ['openai', 'gemini', 'claude', 'cascade']
     results = []
 
     print(f"\n{'Model':<10} | {'Image':<10} | {'Organelle':<15} | {'IoU (%)':<10}")
     print("-" * 65)
 
-    for model in MODELS:
-        pred_col = f"{model}_predictions"
-        if pred_col not in df.columns: continue
+    with stage("match"):
+        for model in MODELS:
+            pred_col = f"{model}_predictions"
+            if pred_col not in df.columns: continue
 
-        for _, row in df.iterrows():
-            img_id = row['image_id']
-            gt_dict = json.loads(row['gt_bboxes'])
-            predictions = robust_json_parser(row[pred_col])
+            for _, row in df.iterrows():
+                img_id = row['image_id']
+                gt_dict = json.loads(row['gt_bboxes'])
+                with stage("parse"):
+                    predictions = robust_json_parser(row[pred_col])
             
-            if not predictions: continue
-
-            for gt_label, gt_box in gt_dict.items():
-                best_iou = 0.0
-                valid_keywords = SYNONYMS.get(gt_label, [gt_label])
-                
-                # Check for label matches in AI output
-                for p_label, p_data in predictions.items():
-                    if any(word in p_label.lower() for word in valid_keywords):
-                        # Use get_enclosing_box to handle nested/multiple boxes
-                        final_p_box = get_enclosing_box(p_data)
-                        if final_p_box:
-                            iou = calculate_iou(gt_box, final_p_box)
-                            best_iou = max(best_iou, iou)
-
-                print(f"{model:<10} | {img_id:<10} | {gt_label:<15} | {best_iou*100:>7.2f}%")
-                results.append({"model": model, "image": img_id, "label": gt_label, "iou": best_iou})
+                if not predictions: continue
+
+                for gt_label, gt_box in gt_dict.items():
+                    # Best-IoU synonym match (nested/multiple boxes collapse to their enclosing box)
+                    p_box = match_box(predictions, gt_label, gt_box)
+                    best_iou = calculate_iou(gt_box, p_box) if p_box else 0.0
+
+                    print(f"{model:<10} | {img_id:<10} | {gt_label:<15} | {best_iou*100:>7.2f}%")
+                    results.append({"model": model, "image": img_id, "label": gt_label, "iou": best_iou})
 
     # Final reporting logic
-    res_df = pd.DataFrame(results)
-    if not res_df.empty:
-        print("\n" + "="*65)
-        print("FINAL SEGMENTATION SUMMARY (IoU)")
-        print("="*65)
-        for model in res_df['model'].unique():
-            m_data = res_df[res_df['model'] == model]
-            # Split Test vs Example
-            test_set = m_data[~m_data['image'].isin(example_ids)]
-            ex_set = m_data[m_data['image'].isin(example_ids)]
+    with stage("aggregate"):
+        res_df = pd.DataFrame(results)
+        if not res_df.empty:
+            print("\n" + "="*65)
+            print("FINAL SEGMENTATION SUMMARY (IoU, 95% bootstrap CI in brackets)")
+            print("="*65)
+            for model in res_df['model'].unique():
+                m_data = res_df[res_df['model'] == model]
+                # Split Test vs Example
+                test_set = m_data[~m_data['image'].isin(example_ids)]
+                ex_set = m_data[m_data['image'].isin(example_ids)]
             
-            test_avg = test_set['iou'].mean() if not test_set.empty else 0
-            ex_avg = ex_set['iou'].mean() if not ex_set.empty else 0
+                # Means with 95% bootstrap confidence intervals over (image, organelle) units
+                test_ci = format_ci(*bootstrap_ci(test_set['iou']), scale=100, unit="%")
+                ex_ci = format_ci(*bootstrap_ci(ex_set['iou']), scale=100, unit="%")
             
-            print(f"Model: {model.upper():<8}")
-            print(f" - [Generalization] New Images Mean: {test_avg*100:.2f}%")
-            print(f" - [Memorization]   Example IoU:     {ex_avg*100:.2f}%")
-            print("-" * 45)
\ No newline at end of file
+                print(f"Model: {model.upper():<8}")
+                print(f" - [Generalization] New Images Mean: {test_ci}")
+                print(f" - [Memorization]   Example IoU:     {ex_ci}")
+                print("-" * 45)
+
+            # Paired model-vs-model significance on the generalization set
+            test_df = res_df[~res_df['image'].isin(example_ids)]
+            comparisons = paired_model_comparison(test_df, ['image', 'label'], 'iou')
+            if comparisons:
+                print("\nPAIRED COMPARISON (Generalization IoU, paired bootstrap)")
+                for comp in comparisons:
+                    print(f" - {comp['model_a'].upper()} vs {comp['model_b'].upper()}: "
+                          f"dIoU = {format_ci(comp['diff'], comp['lower'], comp['upper'], scale=100, unit='%')} "
+                          f"| p = {comp['p_value']:.4f} (n={comp['n']})")
+
+    return res_df
\ No newline at end of file
@@ -2,6 +2,7 @@
 import pandas as pd
 import ast
 from pathlib import Path
+from utils import bootstrap_ci, paired_model_comparison, format_ci, stage
 
 # Define synonyms to bridge the gap between AI descriptions and Expert labels
 SYNONYMS = {
@@ -23,7 +24,8 @@ def evaluate_results(results_path="results/all_models_summary.csv"):
         return
 
     print(f"\n📊 Loading results for fuzzy-match evaluation: {path}")
-    df = pd.read_csv(path)
+    with stage("load"):
+        df = pd.read_csv(path)
 
     # Safely parse string lists into Python lists
     def safe_parse(x):
@@ -36,48 +38,58 @@ def evaluate_results(results_path="results/all_models_summary.csv"):
             # Handle raw text or improperly formatted lists
             return [str(x)]
 
-    df["ground_truth"] = df["ground_truth"].apply(safe_parse)
-    df["predictions"] = df["predictions"].apply(safe_parse)
+    with stage("parse"):
+        df["ground_truth"] = df["ground_truth"].apply(safe_parse)
+        df["predictions"] = df["predictions"].apply(safe_parse)
 
     # Identify all unique organelle types present in the Ground Truth
     all_gt_labels = set([label for sublist in df["ground_truth"] for label in sublist])
     
     results_summary = []
+    hit_records = []
 
     # Calculate Recall for each model
-    for model_name in df["model"].unique():
-        model_df = df[df["model"] == model_name]
-        metrics = {"model": model_name, "total_samples": len(model_df)}
+    with stage("match"):
+        for model_name in df["model"].unique():
+            model_df = df[df["model"] == model_name]
+            metrics = {"model": model_name, "total_samples": len(model_df)}
         
-        for label in sorted(all_gt_labels):
-            label_lower = label.lower()
+            for label in sorted(all_gt_labels):
+                label_lower = label.lower()
             
-            def check_hit(row):
-                # Only evaluate if this label exists in the expert Ground Truth for this image
-                gt_list = [str(g).lower() for g in row["ground_truth"]]
-                if label_lower not in gt_list:
-                    return None
+                def check_hit(row):
+                    # Only evaluate if this label exists in the expert Ground Truth for this image
+                    gt_list = [str(g).lower() for g in row["ground_truth"]]
+                    if label_lower not in gt_list:
+                        return None
                 
-                # Get the list of accepted synonyms for this organelle
-                valid_keywords = SYNONYMS.get(label_lower, [label_lower])
+                    # Get the list of accepted synonyms for this organelle
+                    valid_keywords = SYNONYMS.get(label_lower, [label_lower])
                 
-                # Join all AI predictions into one big string for searching
-                pred_text = " ".join([str(p).lower() for p in row["predictions"]])
+                    # Join all AI predictions into one big string for searching
+                    pred_text = " ".join([str(p).lower() for p in row["predictions"]])
                 
-                # Check if ANY synonym or the label itself is mentioned
-                if any(word in pred_text for word in valid_keywords):
-                    return 1
-                return 0
+                    # Check if ANY synonym or the label itself is mentioned
+                    if any(word in pred_text for word in valid_keywords):
+                        return 1
+                    return 0
 
-            hits = model_df.apply(check_hit, axis=1).dropna()
+                hits = model_df.apply(check_hit, axis=1).dropna()
             
-            if len(hits) > 0:
-                recall = hits.mean()
-                metrics[f"{label}_recall"] = f"{recall:.1%}"
-            else:
-                metrics[f"{label}_recall"] = "N/A"
+                if len(hits) > 0:
+                    recall = hits.mean()
+                    metrics[f"{label}_recall"] = f"{recall:.1%}"
+                    _, lower, upper = bootstrap_ci(hits.astype(float))
+                    metrics[f"{label}_recall_ci"] = f"[{lower:.1%}, {upper:.1%}]"
+                else:
+                    metrics[f"{label}_recall"] = "N/A"
+                    metrics[f"{label}_recall_ci"] = "N/A"
+
+                for idx, hit in hits.items():
+                    image = model_df.at[idx, "image_id"] if "image_id" in model_df.columns else idx
+                    hit_records.append({"model": model_name, "image": image, "label": label, "hit": float(hit)})
         
-        results_summary.append(metrics)
+            results_summary.append(metrics)
 
     # Create and display the summary table
     summary_df = pd.DataFrame(results_summary)
@@ -92,9 +104,22 @@ def evaluate_results(results_path="results/all_models_summary.csv"):
     print(summary_df.to_string(index=False))
     print("="*80)
 
+    # Paired model-vs-model significance on recall over (image, label) units
+    with stage("aggregate"):
+        if hit_records:
+            comparisons = paired_model_comparison(pd.DataFrame(hit_records), ["image", "label"], "hit")
+            if comparisons:
+                print("PAIRED COMPARISON (Recall, paired bootstrap)")
+                for comp in comparisons:
+                    print(f" - {str(comp['model_a']).upper()} vs {str(comp['model_b']).upper()}: "
+                          f"diff = {format_ci(comp['diff'], comp['lower'], comp['upper'], scale=100, unit='%', decimals=1)} "
+                          f"| p = {comp['p_value']:.4f} (n={comp['n']})")
+                print("="*80)
+
     # Save final report
     out_path = Path(results_path).parent / "evaluation_report_fuzzy.csv"
-    summary_df.to_csv(out_path, index=False)
+    with stage("write"):
+        summary_df.to_csv(out_path, index=False)
     print(f"\n Fuzzy-match evaluation report saved to {out_path}")
 
 if __name__ == "__main__":
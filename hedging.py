@@ -0,0 +1,148 @@
+# hedging.py
+import time
+import threading
+import numpy as np
+import pandas as pd
+from collections import deque
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_HEDGING = {
+    "percentile": 95,     # hedge once a call outlives this percentile of recent latencies
+    "min_samples": 20,    # latencies to observe before hedging starts
+    "window": 200,        # recent latencies kept per provider
+    "min_delay_s": 0.0,   # never hedge sooner than this
+    "max_hedges": 1,      # duplicate requests per call
+}
+
+def is_error_response(preds):
+    """
+    Client failures (timeouts included) come back as 'ERROR: ...', possibly wrapped in a list.
+    """
+    return "ERROR" in str(preds)
+
+class HedgedCaller:
+    """
+    Wraps one provider's single-image inference callable with request hedging. Each call
+    starts a request; if it has not answered once the configured percentile of that
+    provider's recent latencies has elapsed, a duplicate is issued and the first valid
+    response wins; is_valid(preds) decides validity (default: not an error response, use
+    utils.is_failed_prediction to also reject refusals and non-conforming answers).
+    Python threads cannot be interrupted, so the losing request is cancelled if it has
+    not started and otherwise ignored; its request deadline bounds how long it runs.
+    Every attempt's latency (losers included) feeds the percentile, so the tail stays
+    visible.
+    """
+
+    def __init__(self, infer_fn, provider, config=None, max_workers=8, is_valid=None):
+        self.infer_fn = infer_fn
+        self.provider = provider
+        self.is_valid = is_valid or (lambda preds: not is_error_response(preds))
+        self.config = {**DEFAULT_HEDGING, **(config or {})}
+        self.latencies = deque(maxlen=self.config["window"])
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0, "extra_requests": 0}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"hedge-{provider}")
+
+    def hedge_delay(self):
+        """
+        Seconds to wait before hedging, or None while there is too little latency history.
+        """
+        with self._lock:
+            if len(self.latencies) < self.config["min_samples"]:
+                return None
+            recent = list(self.latencies)
+        return max(self.config["min_delay_s"], float(np.percentile(recent, self.config["percentile"])))
+
+    def _attempt(self, image_path):
+        start = time.perf_counter()
+        try:
+            preds = self.infer_fn(image_path)
+        except Exception as e:
+            preds = f"ERROR: {e}"
+        with self._lock:
+            self.latencies.append(time.perf_counter() - start)
+        return preds
+
+    def __call__(self, image_path, allow_hedge=True):
+        """
+        Returns (predictions, attempts), attempts being the number of requests issued
+        (each one is billed). allow_hedge=False sends a single request (e.g. near the budget).
+        """
+        futures = [self._pool.submit(self._attempt, image_path)]
+        pending = set(futures)
+        delay = self.hedge_delay() if allow_hedge else None
+        result, winner = None, None
+
+        while pending:
+            can_hedge = delay is not None and len(futures) <= self.config["max_hedges"]
+            done, pending = wait(pending, timeout=delay if can_hedge else None, return_when=FIRST_COMPLETED)
+            if not done:
+                # Every request in flight outlived the hedge delay: issue a duplicate
+                hedge = self._pool.submit(self._attempt, image_path)
+                futures.append(hedge)
+                pending.add(hedge)
+                continue
+            for future in done:
+                preds = future.result()
+                if self.is_valid(preds):
+                    result, winner = preds, futures.index(future)
+                    break
+                result = preds  # keep the invalid answer in case nothing valid arrives
+            if winner is not None:
+                break
+
+        for future in pending:
+            future.cancel()
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["extra_requests"] += len(futures) - 1
+            if len(futures) > 1:
+                self.stats["hedged"] += 1
+            if winner is not None and winner > 0:
+                self.stats["hedge_wins"] += 1
+        return result, len(futures)
+
+    def close(self):
+        # Do not wait for ignored losers; their request deadline ends them
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+def latency_percentiles(latencies):
+    """
+    p50/p95/p99/max of a list of call latencies (seconds).
+    """
+    values = np.asarray([v for v in latencies if v is not None and not pd.isna(v)], dtype=np.float64)
+    if len(values) == 0:
+        return {"p50_s": float("nan"), "p95_s": float("nan"), "p99_s": float("nan"), "max_s": float("nan")}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_s": float(p50), "p95_s": float(p95), "p99_s": float(p99), "max_s": float(values.max())}
+
+def write_hedging_report(callers, extra_costs, call_latencies, experiment_dir):
+    """
+    Prints and saves hedging_report.csv: hedge rate, hedge wins, extra requests, their
+    estimated cost and the observed call-latency percentiles per provider.
+    """
+    rows = []
+    for provider, caller in callers.items():
+        stats = caller.stats
+        rows.append({
+            "provider": provider,
+            **stats,
+            "hedge_rate": stats["hedged"] / stats["calls"] if stats["calls"] else 0.0,
+            "extra_cost_usd": extra_costs.get(provider, 0.0),
+            **latency_percentiles(call_latencies.get(provider, [])),
+        })
+    report_df = pd.DataFrame(rows)
+    report_file = Path(experiment_dir) / "hedging_report.csv"
+    report_df.to_csv(report_file, index=False)
+
+    print("\n" + "=" * 80)
+    print("REQUEST HEDGING")
+    print("=" * 80)
+    for r in rows:
+        print(f" {r['provider'].upper():<8} | hedged {r['hedged']}/{r['calls']} ({r['hedge_rate']:.1%}) | "
+              f"hedge wins {r['hedge_wins']} | extra ${r['extra_cost_usd']:.4f} | "
+              f"p50 {r['p50_s']:.2f} s | p99 {r['p99_s']:.2f} s")
+    print(f" Hedging report saved: {report_file}")
+    return report_file
@@ -1,6 +1,7 @@
 import base64
 import json
 import anthropic
+from utils import parse_structured_response, encode_image, stage, MAX_OUTPUT_TOKENS
 
 def init_claude_client(api_key: str):
     """
@@ -8,45 +9,74 @@ def init_claude_client(api_key: str):
     """
     return anthropic.Anthropic(api_key=api_key)
 
-def analyze_image_claude(client, image_path, prompt_text):
+def analyze_image_claude(client, image_path, prompt_text, output_schema=None, model="claude-sonnet-4-20250514", encoding=None,
+                         timeout=None):
     """
-    Inference function for Claude 3.5 Sonnet.
+    Inference function for Claude Sonnet (or another Claude vision model via `model`).
     Accepts system prompt instructions within the message body.
+    If output_schema is given, the answer is forced through a tool call with that input schema.
+    encoding (optional) re-encodes the slice, e.g. {"codec": "webp", "quality": 90}.
+    timeout (seconds) is the request deadline; a timed-out call returns an ERROR like any failure.
     """
-    with open(image_path, "rb") as f:
-        img_bytes = f.read()
-    b64_image = base64.b64encode(img_bytes).decode("utf-8")
+    with stage("encode"):
+        img_bytes, media_type = encode_image(image_path, encoding)
+        b64_image = base64.b64encode(img_bytes).decode("utf-8")
+
+    with stage("request-build"):
+        request_options = {}
+        if output_schema:
+            request_options["tools"] = [{
+                "name": "record_structures",
+                "description": "Record the detected structures in the required format.",
+                "input_schema": output_schema
+            }]
+            request_options["tool_choice"] = {"type": "tool", "name": "record_structures"}
+        if timeout:
+            request_options["timeout"] = timeout
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": b64_image
+                        }
+                    },
+                    {"type": "text", "text": prompt_text}
+                ]
+            }
+        ]
 
     try:
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1000,
-            temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/png",
-                                "data": b64_image
-                            }
-                        },
-                        {"type": "text", "text": prompt_text}
-                    ]
-                }
-            ]
-        )
-        text = response.content[0].text.strip()
+        with stage("request"):
+            response = client.messages.create(
+                model=model,
+                max_tokens=MAX_OUTPUT_TOKENS["claude"],
+                temperature=0,
+                messages=messages,
+                **request_options
+            )
+        if output_schema:
+            tool_inputs = [block.input for block in response.content if block.type == "tool_use"]
+            text = json.dumps(tool_inputs[0]) if tool_inputs else response.content[0].text.strip()
+        else:
+            text = response.content[0].text.strip()
     except Exception as e:
         text = f"ERROR: {e}"
 
-    try:
-        clean_text = text.replace('```json', '').replace('```', '').strip()
-        structures = json.loads(clean_text)
-    except Exception:
-        structures = [text]
+    with stage("parse"):
+        if output_schema:
+            # Non-conforming payloads are kept as [text] so the repair pass can find them
+            structures = parse_structured_response(text, output_schema)
+            return structures if structures is not None else [text]
+
+        try:
+            clean_text = text.replace('```json', '').replace('```', '').strip()
+            structures = json.loads(clean_text)
+        except Exception:
+            structures = [text]
 
     return structures
\ No newline at end of file
@@ -2,40 +2,91 @@ import json
 import google.generativeai as genai
 from PIL import Image
 import io
+from utils import parse_structured_response, encode_image, stage, MAX_OUTPUT_TOKENS
 
-def init_gemini_client(api_key: str):
+# Gemini response_schema accepts an OpenAPI subset; everything else is validated locally
+GEMINI_SCHEMA_FIELDS = {"type", "format", "description", "nullable", "enum", "items", "properties", "required",
+                        "anyOf"}
+
+def init_gemini_client(api_key: str, model_name: str = "gemini-2.5-pro"):
     """
     Initialize the Google Gemini client with the provided API key.
     """
     genai.configure(api_key=api_key)
-    # Using 1.5-pro for best multimodal performance in scientific imaging
-    model = genai.GenerativeModel("gemini-2.5-pro") 
+    # Using 2.5-pro for best multimodal performance in scientific imaging
+    model = genai.GenerativeModel(model_name) 
     return model
 
-def analyze_image_gemini(model, image_path, prompt_text):
+def to_gemini_schema(schema):
+    """
+    Converts a JSON Schema into the subset understood by Gemini's response_schema.
+    """
+    converted = {}
+    for key, value in schema.items():
+        if key not in GEMINI_SCHEMA_FIELDS:
+            continue
+        if key == "type":
+            converted[key] = value.upper()
+        elif key == "items":
+            converted[key] = to_gemini_schema(value)
+        elif key == "anyOf":
+            converted[key] = [to_gemini_schema(option) for option in value]
+        elif key == "properties":
+            converted[key] = {name: to_gemini_schema(sub) for name, sub in value.items()}
+        else:
+            converted[key] = value
+    return converted
+
+def analyze_image_gemini(model, image_path, prompt_text, output_schema=None, encoding=None, timeout=None):
     """
     Inference function for Gemini. 
     Accepts model instance, image path, and pre-loaded prompt string.
+    If output_schema is given, the response is constrained via response_schema.
+    encoding (optional) re-encodes the slice, e.g. {"codec": "webp", "quality": 90},
+    and uploads it as an inline blob instead of letting the SDK re-encode a PIL image.
+    timeout (seconds) is the request deadline; a timed-out call returns an ERROR like any failure.
     """
-    with open(image_path, "rb") as f:
-        image_bytes = f.read()
-    image = Image.open(io.BytesIO(image_bytes))
+    if encoding:
+        with stage("encode"):
+            image_bytes, media_type = encode_image(image_path, encoding)
+            image = {"mime_type": media_type, "data": image_bytes}
+    else:
+        with stage("load"):
+            with open(image_path, "rb") as f:
+                image_bytes = f.read()
+            image = Image.open(io.BytesIO(image_bytes))
+
+    with stage("request-build"):
+        # Capped so the run budget can reserve a worst case (thinking tokens count towards it)
+        generation_config = {"temperature": 0, "max_output_tokens": MAX_OUTPUT_TOKENS["gemini"]}
+        if output_schema:
+            generation_config["response_mime_type"] = "application/json"
+            generation_config["response_schema"] = to_gemini_schema(output_schema)
+        request_options = {"request_options": {"timeout": timeout}} if timeout else {}
 
     try:
         # Temperature=0 ensures reproducible scientific results
-        response = model.generate_content(
-            [prompt_text, image],
-            generation_config={"temperature": 0}
-        )
+        with stage("request"):
+            response = model.generate_content(
+                [prompt_text, image],
+                generation_config=generation_config,
+                **request_options
+            )
         text = response.text.strip()
     except Exception as e:
         text = f"ERROR: {e}"
 
-    # Clean Markdown JSON tags if present and parse
-    try:
-        clean_text = text.replace('```json', '').replace('```', '').strip()
-        structures = json.loads(clean_text)
-    except Exception:
-        structures = [text]
+    with stage("parse"):
+        if output_schema:
+            # Non-conforming payloads are kept as [text] so the repair pass can find them
+            structures = parse_structured_response(text, output_schema)
+            return structures if structures is not None else [text]
+
+        # Clean Markdown JSON tags if present and parse
+        try:
+            clean_text = text.replace('```json', '').replace('```', '').strip()
+            structures = json.loads(clean_text)
+        except Exception:
+            structures = [text]
 
     return structures
\ No newline at end of file
@@ -1,6 +1,7 @@
 import base64
 import json
 from openai import OpenAI
+from utils import parse_structured_response, encode_image, stage, MAX_OUTPUT_TOKENS
 
 def init_openai_client(api_key: str):
     """
@@ -8,41 +9,64 @@ def init_openai_client(api_key: str):
     """
     return OpenAI(api_key=api_key)
 
-def analyze_image_openai(client, image_path, prompt_text):
+def analyze_image_openai(client, image_path, prompt_text, output_schema=None, model="gpt-4o", encoding=None,
+                         timeout=None):
     """
-    Inference function for GPT-4o.
+    Inference function for GPT-4o (or another OpenAI vision model via `model`).
     Uses base64 encoding for image transmission.
+    If output_schema is given, the response is constrained via Structured Outputs.
+    encoding (optional) re-encodes the slice, e.g. {"codec": "webp", "quality": 90}.
+    timeout (seconds) is the request deadline; a timed-out call returns an ERROR like any failure.
     """
-    with open(image_path, "rb") as f:
-        img_bytes = f.read()
-    b64 = base64.b64encode(img_bytes).decode("utf-8")
+    with stage("encode"):
+        img_bytes, media_type = encode_image(image_path, encoding)
+        b64 = base64.b64encode(img_bytes).decode("utf-8")
+
+    with stage("request-build"):
+        request_options = {}
+        if output_schema:
+            request_options["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "structures", "schema": output_schema, "strict": True}
+            }
+        if timeout:
+            request_options["timeout"] = timeout
+        messages = [
+            {
+                "role": "system", 
+                "content": "You are an expert in cryo-electron tomography and cell biology."
+            },
+            {
+                "role": "user", 
+                "content": [
+                    {"type": "text", "text": prompt_text},
+                    {"type": "image_url", "image_url": {"url": f"data:{media_type};base64,{b64}"}}
+                ]
+            }
+        ]
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "You are an expert in cryo-electron tomography and cell biology."
-                },
-                {
-                    "role": "user", 
-                    "content": [
-                        {"type": "text", "text": prompt_text},
-                        {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
-                    ]
-                }
-            ],
-            temperature=0, # Crucial for coordinate precision
-            max_tokens=1000
-        )
+        with stage("request"):
+            response = client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0, # Crucial for coordinate precision
+                max_tokens=MAX_OUTPUT_TOKENS["openai"],
+                **request_options
+            )
         text = response.choices[0].message.content.strip()
     except Exception as e:
         text = f"ERROR: {e}"
 
-    try:
-        clean_text = text.replace('```json', '').replace('```', '').strip()
-        structures = json.loads(clean_text)
-    except Exception:
-        structures = [text]
+    with stage("parse"):
+        if output_schema:
+            # Non-conforming payloads are kept as [text] so the repair pass can find them
+            structures = parse_structured_response(text, output_schema)
+            return structures if structures is not None else [text]
+
+        try:
+            clean_text = text.replace('```json', '').replace('```', '').strip()
+            structures = json.loads(clean_text)
+        except Exception:
+            structures = [text]
     return structures
\ No newline at end of file
@@ -0,0 +1,109 @@
+import json
+import time
+import random
+import itertools
+from types import SimpleNamespace
+
+# Local stand-ins for the provider SDKs. They expose the exact call surfaces used by
+# the analyze_image_* functions (client.chat.completions.create, model.generate_content,
+# client.messages.create) and replay a scripted list of payloads, so the clients can be
+# exercised offline with schema-conforming and non-conforming responses.
+#
+# Each payload is either a dict/list (serialized as the provider would return it) or a
+# raw string (returned verbatim, e.g. prose, refusals or malformed JSON). An optional
+# injected latency (with the SDKs' timeout options honoured) makes tail behaviour testable.
+
+def _payload_text(payload):
+    return payload if isinstance(payload, str) else json.dumps(payload)
+
+def latency_distribution(median_s=0.2, sigma=0.3, tail_prob=0.03, tail_s=(2.0, 4.0), seed=0):
+    """
+    Returns a sampler of request latencies: log-normal around median_s, plus a tail_prob
+    chance of a stalled request lasting uniformly tail_s seconds.
+    """
+    rng = random.Random(seed)
+
+    def sample():
+        if rng.random() < tail_prob:
+            return rng.uniform(*tail_s)
+        return rng.lognormvariate(0.0, sigma) * median_s
+    return sample
+
+def _simulate_latency(latency, timeout):
+    """
+    Sleeps for the injected latency; past the request deadline it raises like the SDKs do.
+    """
+    if latency is None:
+        return
+    delay = latency() if callable(latency) else latency
+    if timeout and delay > timeout:
+        time.sleep(timeout)
+        raise TimeoutError(f"Request timed out after {timeout}s")
+    time.sleep(delay)
+
+class StandInOpenAI:
+    """
+    Mimics openai.OpenAI for chat.completions.create.
+    """
+    def __init__(self, payloads, record=True, latency=None):
+        self._payloads = itertools.cycle(payloads)
+        self.record = record
+        self.latency = latency
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        if self.record:
+            self.requests.append(kwargs)
+        _simulate_latency(self.latency, kwargs.get("timeout"))
+        message = SimpleNamespace(content=_payload_text(next(self._payloads)))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+class StandInGemini:
+    """
+    Mimics google.generativeai.GenerativeModel for generate_content.
+    """
+    def __init__(self, payloads, record=True, latency=None):
+        self._payloads = itertools.cycle(payloads)
+        self.record = record
+        self.latency = latency
+        self.requests = []
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        if self.record:
+            self.requests.append({"contents": contents, "generation_config": generation_config, **kwargs})
+        _simulate_latency(self.latency, kwargs.get("request_options", {}).get("timeout"))
+        return SimpleNamespace(text=_payload_text(next(self._payloads)))
+
+class StandInClaude:
+    """
+    Mimics anthropic.Anthropic for messages.create.
+    When the request forces a tool, dict payloads come back as a tool_use block.
+    """
+    def __init__(self, payloads, record=True, latency=None):
+        self._payloads = itertools.cycle(payloads)
+        self.record = record
+        self.latency = latency
+        self.requests = []
+        self.messages = SimpleNamespace(create=self._create)
+
+    def _create(self, **kwargs):
+        if self.record:
+            self.requests.append(kwargs)
+        _simulate_latency(self.latency, kwargs.get("timeout"))
+        payload = next(self._payloads)
+        if kwargs.get("tools") and isinstance(payload, dict):
+            block = SimpleNamespace(type="tool_use", name=kwargs["tools"][0]["name"], input=payload)
+        else:
+            block = SimpleNamespace(type="text", text=_payload_text(payload))
+        return SimpleNamespace(content=[block])
+
+def make_standin_clients(payloads, record=True, latency=None):
+    """
+    Returns (openai_client, gemini_model, claude_client) stand-ins that all replay `payloads`.
+    Drop-in replacements for the init_*_client results in run_all_models / repair_failed_rows.
+    record=False skips keeping every request (with its base64 image) for large benchmark runs.
+    latency (seconds or a sampler such as latency_distribution()) is injected into every call.
+    """
+    return (StandInOpenAI(payloads, record, latency), StandInGemini(payloads, record, latency),
+            StandInClaude(payloads, record, latency))
@@ -1,16 +1,46 @@
 # main.py
 import os
-from utils import load_api_keys, get_prompt_by_id
+import argparse
+from utils import load_api_keys, get_prompt_by_id, get_schema_by_id, RunBudget, enable_profiling, write_profile
 from llm import init_openai_client, init_gemini_client, init_claude_client
-from run import run_all_models
+from run import run_all_models, load_run_state
+from planner import dry_run as plan_dry_run
+from repair import repair_failed_rows
+from cascade import run_cascade
+from preprocess import preprocess_dataset, config_key
+from benchmark_codecs import benchmark_codecs
+from render_overlays import render_overlays
 from evaluate_vlm_results import evaluate_results
 from evaluate_spatial_accuracy import evaluate_coordinate_errors
 from evaluate_segmentation_iou import evaluate_segmentation_performance
 
-def main(mode="identification"):
+def main(mode="identification", repair=False, strict_repair=True, cascade=False, preprocess=None,
+         encodings=None, codec_benchmark=False, overlays=False, dry_run=False, budget=None, resume=False,
+         concurrency=1, profile=None, sampling=None, timeouts=None, hedging=None):
     """
     Central orchestration script for VLM Cryo-ET identification and localization experiments.
+    With repair=True, only the failed rows of an existing experiment are re-queried.
+    With cascade=True, slices go to the cheap model tier first and escalate on disagreement.
+    preprocess (optional dict, see preprocess.py) filters the slices before inference.
+    encodings (optional) selects the image codec per provider; codec_benchmark=True sweeps codecs instead.
+    With overlays=True, GT-vs-prediction *_compare.png images are (re)rendered after evaluation.
+    dry_run=True prints the per-provider request/token/cost/time plan (at `concurrency`) and stops.
+    budget (RunBudget) caps the spend of a full run, cascade, repair pass or codec benchmark;
+    resume=True continues a stopped full run.
+    profile ("stages" or "sample") times the local pipeline stages; results/<EXP>/profile_stages.csv.
+    sampling (dict, see adaptive.py) queries a stratified sample and stops once metrics are tight enough.
+    timeouts overrides the per-provider request deadlines; hedging (dict, see hedging.py) duplicates slow calls.
     """
+    # Flags that only the full run_all_models sweep implements must not be dropped silently
+    if not dry_run and (codec_benchmark or cascade or repair):
+        unsupported = {"--hedge": hedging is not None, "--sample": sampling is not None, "--resume": resume,
+                       "--encoding": codec_benchmark and bool(encodings)}
+        unsupported = [flag for flag, used in unsupported.items() if used]
+        if unsupported:
+            task = "--codec-benchmark" if codec_benchmark else ("--cascade" if cascade else "--repair")
+            print(f" Error: {', '.join(unsupported)} cannot be combined with {task}.")
+            return
+
     # --- 1. Path Configuration ---
     # Define file paths before using them in function calls
     KEY_FILE = "keys/api_keys.txt"
@@ -18,12 +48,16 @@ def main(mode="identification"):
 
     # --- 2. Initialization ---
     print(f"--- System Initialization ---")
-    keys = load_api_keys(KEY_FILE)
-    
-    # Initialize clients for OpenAI, Gemini, and Claude
-    o_client = init_openai_client(keys.get("OPENAI_API_KEY"))
-    g_model  = init_gemini_client(keys.get("GEMINI_API_KEY"))
-    c_client = init_claude_client(keys.get("ANTHROPIC_API_KEY"))
+    if dry_run:
+        # Planning never calls an API, so no keys or clients are needed
+        o_client = g_model = c_client = None
+    else:
+        keys = load_api_keys(KEY_FILE)
+
+        # Initialize clients for OpenAI, Gemini, and Claude
+        o_client = init_openai_client(keys.get("OPENAI_API_KEY"))
+        g_model  = init_gemini_client(keys.get("GEMINI_API_KEY"))
+        c_client = init_claude_client(keys.get("ANTHROPIC_API_KEY"))
 
     # --- 3. Experiment Mode Selection ---
     if mode == "identification":
@@ -53,24 +87,221 @@ def main(mode="identification"):
         print(f" Error: Could not retrieve prompt template for '{SELECTED_PROMPT_ID}'")
         return
 
+    # Optional JSON schema declared as [PROMPT_ID:schema] in the collection file
+    output_schema = get_schema_by_id(PROMPT_FILE, SELECTED_PROMPT_ID)
+
+    # --- 5. Optional Slice Preprocessing ---
+    # Filtered slices are cached, and each filter config gets its own experiment directory
+    EXPERIMENT_NAME = SELECTED_PROMPT_ID
+    if preprocess:
+        # Filtering keeps slice dimensions, so a dry run plans against the source slices
+        if not dry_run:
+            DATASET_CSV = preprocess_dataset(DATASET_CSV, preprocess)
+        EXPERIMENT_NAME = f"{SELECTED_PROMPT_ID}_PREPROCESSED_{config_key(preprocess)[:10]}"
+
     print(f" Active Mode: {mode}")
     print(f" Target Prompt ID: {SELECTED_PROMPT_ID}")
+    print(f" Structured Output: {'enabled' if output_schema else 'disabled'}")
+
+    # --- 6. Batch Inference Execution ---
+    if profile:
+        # Stage timers are near-free; "sample" also records Python stacks every 5 ms for a flamegraph
+        enable_profiling(sample_interval=0.005 if profile == "sample" else None)
 
-    # --- 5. Batch Inference Execution ---
-    # run_all_models processes each image in the CSV independently (Single-slice Baseline)
-    summary_path = run_all_models(
-        openai_client=o_client,
-        gemini_model=g_model,
-        claude_client=c_client,
-        prompt_text=prompt_content,
-        dataset_csv=DATASET_CSV,
-        experiment_name=SELECTED_PROMPT_ID
-    )
-
-    # --- 6. Post-Inference Evaluation ---
+    if dry_run:
+        # Estimates the full run_all_models sweep (flagship tier) without sending requests
+        plan_dry_run(EXPERIMENT_NAME, DATASET_CSV, prompt_content, output_schema=output_schema,
+                     concurrency=concurrency, budget=budget)
+        if profile:
+            write_profile(os.path.join("results", EXPERIMENT_NAME))
+        return
+    elif codec_benchmark:
+        if mode == "identification":
+            print(" Error: The codec benchmark scores IoU or coordinate error; pick a spatial mode.")
+            return
+        # Reports payload size, latency and accuracy for each codec setting, then stops
+        benchmark_codecs(
+            experiment_name=EXPERIMENT_NAME,
+            dataset_csv=DATASET_CSV,
+            openai_client=o_client,
+            gemini_model=g_model,
+            claude_client=c_client,
+            prompt_text=prompt_content,
+            output_schema=output_schema,
+            eval_mode=mode,
+            budget=budget,
+            timeouts=timeouts
+        )
+        if profile:
+            write_profile(os.path.join("results", f"{EXPERIMENT_NAME}_CODEC_BENCHMARK"))
+        return
+    elif cascade:
+        if mode == "identification":
+            print(" Error: Cascade routing needs structured (coordinate/bbox) answers.")
+            return
+        # Cheap tier for Gemini is a separate model instance
+        g_cheap_model = init_gemini_client(keys.get("GEMINI_API_KEY"), model_name="gemini-2.5-flash")
+        summary_path = run_cascade(
+            openai_client=o_client,
+            cheap_gemini_model=g_cheap_model,
+            gemini_model=g_model,
+            claude_client=c_client,
+            prompt_text=prompt_content,
+            experiment_name=EXPERIMENT_NAME,
+            dataset_csv=DATASET_CSV,
+            output_schema=output_schema,
+            encodings=encodings,
+            timeouts=timeouts,
+            budget=budget
+        )
+    elif repair:
+        # Targeted repair: re-issue only failed/unparseable (model, image) requests
+        repair_failed_rows(
+            openai_client=o_client,
+            gemini_model=g_model,
+            claude_client=c_client,
+            prompt_text=prompt_content,
+            experiment_name=EXPERIMENT_NAME,
+            strict=strict_repair,
+            # Identification prompts ask for prose, so only ERROR cells are failures there
+            structured=(mode != "identification"),
+            output_schema=output_schema,
+            encodings=encodings,
+            timeouts=timeouts,
+            budget=budget
+        )
+        summary_path = os.path.join("results", EXPERIMENT_NAME, "all_models_summary.csv")
+    else:
+        # run_all_models processes each image in the CSV independently (Single-slice Baseline)
+        summary_path = run_all_models(
+            openai_client=o_client,
+            gemini_model=g_model,
+            claude_client=c_client,
+            prompt_text=prompt_content,
+            dataset_csv=DATASET_CSV,
+            experiment_name=EXPERIMENT_NAME,
+            output_schema=output_schema,
+            encodings=encodings,
+            budget=budget,
+            resume=resume,
+            sampling=sampling,
+            timeouts=timeouts,
+            hedging=hedging,
+            structured=(mode != "identification")
+        )
+        if load_run_state(os.path.dirname(summary_path)).get("status") == "budget_exhausted":
+            print(" Run stopped by the budget; skipping evaluation until it is resumed (--resume).")
+            if profile:
+                write_profile(os.path.dirname(summary_path))
+            return
+
+    # --- 7. Post-Inference Evaluation ---
     # Trigger the appropriate scoring function based on the experiment mode
     print(f"\n--- Launching Post-Processing Evaluation: {mode} ---")
     eval_func(summary_path)
 
+    if profile:
+        write_profile(os.path.dirname(summary_path))
+
+    if overlays:
+        if mode == "identification":
+            print(" Overlays need coordinate or bbox ground truth; skipping for identification mode.")
+        else:
+            # Cascade runs draw the cascade column from cascade_summary.csv
+            render_overlays(os.path.dirname(summary_path), contact_sheet=True,
+                            summary_name=os.path.basename(summary_path))
+
 if __name__ == "__main__":
-    main(mode="Segmentation")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="CryoTextMiner VLM experiments")
+    parser.add_argument("--mode", default="Segmentation",
+                        choices=["identification", "Coordinate Detection", "Segmentation"])
+    parser.add_argument("--repair", action="store_true",
+                        help="Re-query only failed/unparseable rows of an existing experiment")
+    parser.add_argument("--no-strict-repair", action="store_true",
+                        help="Retry failed rows with the original prompt instead of the stricter follow-up")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Route slices through the cheap model tier and escalate only on disagreement")
+    parser.add_argument("--z-average", type=int, default=0,
+                        help="Average each slice with its +/-K neighbouring slices before inference")
+    parser.add_argument("--denoise", choices=["gaussian", "bilateral"],
+                        help="Denoise slices before inference")
+    parser.add_argument("--sigma", type=float, default=1.5,
+                        help="Spatial sigma (px) for the denoising filter")
+    parser.add_argument("--contrast-stretch", action="store_true",
+                        help="Apply a 1-99 percentile contrast stretch before inference")
+    parser.add_argument("--encoding", default=None,
+                        help="Image codec for all providers: png, webp:lossless, webp:<quality> or jpeg:<quality>")
+    parser.add_argument("--codec-benchmark", action="store_true",
+                        help="Sweep codecs/qualities and report payload size, latency and accuracy")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print the request/token/cost/wall-time plan per provider without calling any API")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Requests in flight per provider assumed by the --dry-run wall-time estimate")
+    parser.add_argument("--budget-usd", type=float, default=None,
+                        help="Hard estimated-cost ceiling; each request reserves its worst-case output, "
+                             "so the run stops cleanly before exceeding it")
+    parser.add_argument("--budget-tokens", type=int, default=None,
+                        help="Hard estimated-token ceiling (same worst-case reservation)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue a stopped run, skipping cells already in all_models_summary.csv")
+    parser.add_argument("--profile", choices=["stages", "sample"], default=None,
+                        help="Time local stages (load/encode/request-build/parse/match/aggregate/write); "
+                             "'sample' also writes a collapsed-stack flamegraph file")
+    parser.add_argument("--sample", action="store_true",
+                        help="Adaptive sampling: query stratified slice batches until the metric CIs are tight")
+    parser.add_argument("--sample-batch", type=int, default=8,
+                        help="Slices per adaptive-sampling batch")
+    parser.add_argument("--target-ci", type=float, default=0.10,
+                        help="Target 95%% CI width for IoU/recall (fraction) when sampling")
+    parser.add_argument("--target-ci-nm", type=float, default=50.0,
+                        help="Target 95%% CI width for coordinate error (nm) when sampling")
+    parser.add_argument("--deadline", action="append", default=[], metavar="PROVIDER=SECONDS",
+                        help="Per-provider request deadline, e.g. --deadline gemini=90 (repeatable)")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Re-issue calls slower than a latency percentile; the first valid answer wins")
+    parser.add_argument("--hedge-percentile", type=float, default=95,
+                        help="Latency percentile after which a duplicate request is sent")
+    parser.add_argument("--overlays", action="store_true",
+                        help="Render GT-vs-prediction overlays and a contact sheet after evaluation")
+    args = parser.parse_args()
+
+    encodings = None
+    if args.encoding:
+        codec, _, setting = args.encoding.partition(":")
+        encoding = {"codec": codec}
+        if setting == "lossless":
+            encoding["lossless"] = True
+        elif setting:
+            encoding["quality"] = int(setting)
+        encodings = {provider: encoding for provider in ("openai", "gemini", "claude")}
+
+    sampling = None
+    if args.sample:
+        sampling = {"batch_size": args.sample_batch,
+                    "target_ci_width": {"iou": args.target_ci, "recall": args.target_ci, "error_nm": args.target_ci_nm}}
+
+    timeouts = {}
+    for deadline in args.deadline:
+        provider, _, seconds = deadline.partition("=")
+        timeouts[provider] = float(seconds)
+    hedging = {"percentile": args.hedge_percentile} if args.hedge else None
+
+    budget = None
+    if args.budget_usd is not None or args.budget_tokens is not None:
+        budget = RunBudget(max_usd=args.budget_usd, max_tokens=args.budget_tokens)
+
+    preprocess_config = {}
+    if args.z_average:
+        preprocess_config["z_average"] = args.z_average
+    if args.denoise == "gaussian":
+        preprocess_config["denoise"] = {"method": "gaussian", "sigma": args.sigma}
+    elif args.denoise == "bilateral":
+        preprocess_config["denoise"] = {"method": "bilateral", "sigma_spatial": args.sigma}
+    if args.contrast_stretch:
+        preprocess_config["contrast"] = {"low": 1, "high": 99}
+
+    main(mode=args.mode, repair=args.repair, strict_repair=not args.no_strict_repair, cascade=args.cascade,
+         preprocess=preprocess_config or None, encodings=encodings, codec_benchmark=args.codec_benchmark,
+         overlays=args.overlays, dry_run=args.dry_run, budget=budget, resume=args.resume,
+         concurrency=args.concurrency, profile=args.profile, sampling=sampling, timeouts=timeouts or None,
+         hedging=hedging)
@@ -0,0 +1,121 @@
+# planner.py
+import json
+import math
+import pandas as pd
+from pathlib import Path
+from PIL import Image
+from run import MODEL_TIERS
+from utils import (estimate_text_tokens, estimate_image_tokens, estimate_call_cost, provider_for_model,
+                   DEFAULT_OUTPUT_TOKENS)
+
+# Typical single-request latency per provider (seconds) when no previous run is available
+DEFAULT_LATENCY_S = {"openai": 8.0, "gemini": 15.0, "claude": 10.0}
+
+def slice_dimensions(image_paths):
+    """
+    Returns {image_path: (width, height)}; PIL reads only the header, not the pixels.
+    """
+    sizes = {}
+    for path in dict.fromkeys(image_paths):
+        with Image.open(path) as img:
+            sizes[path] = img.size
+    return sizes
+
+def calibrate_from_history(summary_file):
+    """
+    Mean output tokens and latency per provider from a previous all_models_summary.csv.
+    """
+    calibration = {}
+    if summary_file is None or not Path(summary_file).exists():
+        return calibration
+    df = pd.read_csv(summary_file)
+    for provider in DEFAULT_LATENCY_S:
+        pred_col, latency_col = f"{provider}_predictions", f"{provider}_latency_s"
+        entry = {}
+        if pred_col in df.columns:
+            outputs = df[pred_col].dropna()
+            outputs = outputs[~outputs.astype(str).str.startswith("ERROR")]
+            if not outputs.empty:
+                entry["output_tokens"] = outputs.apply(estimate_text_tokens).mean()
+        if latency_col in df.columns and df[latency_col].notna().any():
+            entry["latency_s"] = df[latency_col].mean()
+        if entry:
+            calibration[provider] = entry
+    return calibration
+
+def plan_run(dataset_csv, prompt_text, output_schema=None, tier="flagship", concurrency=1, history_summary=None):
+    """
+    Dry run: estimates what run_all_models would spend without calling any API.
+    Image tokens come from each provider's formula applied to the actual slice dimensions;
+    output tokens and latency are calibrated from history_summary (a previous
+    all_models_summary.csv) when given, otherwise defaults are used.
+    Returns one row per provider: requests, input/output tokens, cost and wall time at the
+    given concurrency (requests in flight per provider).
+    """
+    if not Path(dataset_csv).exists():
+        raise FileNotFoundError(f"Dataset not found: {dataset_csv}")
+
+    df = pd.read_csv(dataset_csv)
+    sizes = slice_dimensions(df["image_path"])
+    calibration = calibrate_from_history(history_summary)
+
+    prompt_tokens = estimate_text_tokens(prompt_text)
+    if output_schema:
+        prompt_tokens += estimate_text_tokens(json.dumps(output_schema))
+
+    rows = []
+    for provider, model_name in MODEL_TIERS[tier].items():
+        requests = len(df)
+        image_tokens = sum(estimate_image_tokens(model_name, *sizes[path]) for path in df["image_path"])
+        input_tokens = requests * prompt_tokens + image_tokens
+        output_per_request = calibration.get(provider, {}).get("output_tokens", DEFAULT_OUTPUT_TOKENS)
+        output_tokens = round(requests * output_per_request)
+        latency = calibration.get(provider, {}).get("latency_s", DEFAULT_LATENCY_S[provider_for_model(model_name)])
+
+        rows.append({
+            "provider": provider,
+            "model": model_name,
+            "requests": requests,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "est_cost_usd": estimate_call_cost(model_name, input_tokens, output_tokens),
+            "est_latency_s": latency,
+            "est_wall_s": math.ceil(requests / max(1, concurrency)) * latency,
+        })
+    return pd.DataFrame(rows)
+
+def print_plan(plan_df, experiment_name, concurrency=1, budget=None):
+    """
+    Prints the dry-run plan. run_all_models queries providers one after another,
+    so the total wall time is the sum over providers.
+    """
+    print("\n" + "=" * 80)
+    print(f"DRY RUN PLAN: {experiment_name} (concurrency {concurrency} per provider)")
+    print("=" * 80)
+    print(plan_df.to_string(index=False, float_format=lambda v: f"{v:,.4f}"))
+    total_cost = plan_df["est_cost_usd"].sum()
+    total_tokens = int(plan_df["input_tokens"].sum() + plan_df["output_tokens"].sum())
+    print("-" * 80)
+    print(f"TOTAL: {int(plan_df['requests'].sum())} requests | {total_tokens:,} tokens | "
+          f"${total_cost:.4f} | ~{plan_df['est_wall_s'].sum() / 60:.1f} min")
+    if budget is not None:
+        if budget.max_usd is not None and total_cost > budget.max_usd:
+            print(f" NOTE: estimated cost exceeds the ${budget.max_usd:g} budget; the run would stop early.")
+        if budget.max_tokens is not None and total_tokens > budget.max_tokens:
+            print(f" NOTE: estimated tokens exceed the {budget.max_tokens:,} token budget; the run would stop early.")
+
+def dry_run(experiment_name, dataset_csv, prompt_text, output_schema=None, concurrency=1, budget=None):
+    """
+    Builds, prints and saves results/<experiment>/dry_run_plan.csv, calibrated from the
+    experiment's previous summary if one exists.
+    """
+    experiment_dir = Path("results") / experiment_name
+    plan_df = plan_run(dataset_csv, prompt_text, output_schema=output_schema, concurrency=concurrency,
+                       history_summary=experiment_dir / "all_models_summary.csv")
+    print_plan(plan_df, experiment_name, concurrency=concurrency, budget=budget)
+
+    experiment_dir.mkdir(parents=True, exist_ok=True)
+    plan_file = experiment_dir / "dry_run_plan.csv"
+    plan_df.to_csv(plan_file, index=False)
+    print(f"\n Plan saved: {plan_file}")
+    return plan_df
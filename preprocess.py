@@ -0,0 +1,205 @@
+# preprocess.py
+import os
+import re
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from utils import parse_z_index, tomogram_key
+
+# Example configuration (every key is optional):
+# {
+#     "z_average": 2,                                        # average +/-2 neighbouring slices
+#     "denoise": {"method": "gaussian", "sigma": 1.5},       # or {"method": "bilateral", ...}
+#     "contrast": {"low": 1, "high": 99}                     # percentile contrast stretch
+# }
+# Stages run in that order: z-averaging, denoising, then contrast stretching.
+
+CACHE_DIR = "cache/preprocessed"
+CHUNK_SLICES = 8  # Slices per batched work unit; bounds memory for z-averaging
+
+def config_key(config):
+    """
+    Stable hash of the filter parameters, used in cache keys and output names.
+    """
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def neighbour_paths(image_path, k):
+    """
+    Returns the +/-k neighbouring slice files that exist on disk (e.g. z185.png..z189.png),
+    ordered by z and including the slice itself.
+    """
+    path = Path(image_path)
+    z = parse_z_index(path)
+    if z is None or k <= 0:
+        return [str(path)]
+    paths = []
+    for dz in range(-k, k + 1):
+        candidate = path.with_name(re.sub(r"z\d+", f"z{z + dz}", path.name, count=1))
+        if candidate.exists():
+            paths.append(str(candidate))
+    return paths
+
+def load_stack(paths):
+    """
+    Decodes 8-bit grayscale slices into one float32 stack of shape (N, H, W) in [0, 1].
+    """
+    return np.stack([np.asarray(Image.open(p).convert("L"), dtype=np.float32) / 255.0 for p in paths])
+
+def z_average(stack, neighbour_index):
+    """
+    Averages each target slice with its available neighbours in one gather.
+    neighbour_index is (T, 2k+1) into the stack, with -1 marking missing slices.
+    """
+    valid = neighbour_index >= 0
+    gathered = stack[np.where(valid, neighbour_index, 0)]
+    gathered *= valid[:, :, None, None]
+    return gathered.sum(axis=1) / valid.sum(axis=1)[:, None, None]
+
+def gaussian_kernel(sigma):
+    radius = max(1, int(np.ceil(3 * sigma)))
+    x = np.arange(-radius, radius + 1, dtype=np.float32)
+    kernel = np.exp(-(x ** 2) / (2 * sigma ** 2))
+    return kernel / kernel.sum(), radius
+
+def gaussian_denoise(stack, sigma=1.0):
+    """
+    Separable Gaussian blur applied to the whole (N, H, W) stack at once.
+    """
+    kernel, radius = gaussian_kernel(sigma)
+    _, height, width = stack.shape
+    out = stack
+    for axis, size in ((1, height), (2, width)):
+        pad = [(0, 0)] * 3
+        pad[axis] = (radius, radius)
+        padded = np.pad(out, pad, mode="reflect")
+        out = np.zeros_like(stack)
+        for i, weight in enumerate(kernel):
+            out += weight * np.take(padded, np.arange(i, i + size), axis=axis)
+    return out
+
+def bilateral_denoise(stack, sigma_spatial=2.0, sigma_range=0.1, radius=None):
+    """
+    Edge-preserving bilateral filter, vectorised over the stack for each window offset.
+    """
+    radius = radius or max(1, int(np.ceil(2 * sigma_spatial)))
+    _, height, width = stack.shape
+    padded = np.pad(stack, ((0, 0), (radius, radius), (radius, radius)), mode="reflect")
+    numerator = np.zeros_like(stack)
+    denominator = np.zeros_like(stack)
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            shifted = padded[:, radius + dy:radius + dy + height, radius + dx:radius + dx + width]
+            spatial = np.exp(-(dy * dy + dx * dx) / (2 * sigma_spatial ** 2))
+            weight = spatial * np.exp(-((shifted - stack) ** 2) / (2 * sigma_range ** 2))
+            numerator += weight * shifted
+            denominator += weight
+    return numerator / denominator
+
+def contrast_stretch(stack, low=1.0, high=99.0):
+    """
+    Per-slice percentile stretch to the full [0, 1] range.
+    """
+    flat = stack.reshape(stack.shape[0], -1)
+    lo, hi = np.percentile(flat, [low, high], axis=1)
+    scale = np.maximum(hi - lo, 1e-6)
+    return np.clip((stack - lo[:, None, None]) / scale[:, None, None], 0.0, 1.0)
+
+def apply_filters(stack, config):
+    """
+    Runs the configured 2D filters on an (N, H, W) stack.
+    """
+    denoise = config.get("denoise")
+    if denoise:
+        params = {k: v for k, v in denoise.items() if k != "method"}
+        if denoise["method"] == "gaussian":
+            stack = gaussian_denoise(stack, **params)
+        elif denoise["method"] == "bilateral":
+            stack = bilateral_denoise(stack, **params)
+        else:
+            raise ValueError(f"Unsupported denoise method: {denoise['method']}")
+
+    contrast = config.get("contrast")
+    if contrast:
+        stack = contrast_stretch(stack, **contrast)
+    return stack
+
+def process_chunk(targets, groups, config):
+    """
+    Loads the slices one chunk needs, z-averages them and applies the 2D filters.
+    """
+    sources = sorted({p for group in groups for p in group})
+    position = {p: i for i, p in enumerate(sources)}
+    stack = load_stack(sources)
+
+    width = max(len(group) for group in groups)
+    neighbour_index = np.full((len(groups), width), -1, dtype=np.int64)
+    for row, group in enumerate(groups):
+        neighbour_index[row, :len(group)] = [position[p] for p in group]
+
+    filtered = apply_filters(z_average(stack, neighbour_index), config)
+    return list(zip(targets, filtered))
+
+def preprocess_dataset(dataset_csv, config, cache_dir=CACHE_DIR, max_workers=None):
+    """
+    Applies the preprocessing config to every slice referenced by the dataset CSV and
+    writes a copy of the CSV whose image_path points at the filtered PNGs.
+    Outputs are cached by source-file hash and filter parameters, so repeated prompt
+    sweeps never recompute the same filtered image.
+    """
+    df = pd.read_csv(dataset_csv)
+    cache_path = Path(cache_dir)
+    cache_path.mkdir(parents=True, exist_ok=True)
+
+    params_key = config_key(config)
+    k = int(config.get("z_average", 0))
+
+    outputs = {}
+    pending = []
+    # Each slice belongs to up to 2k+1 groups; hash its file once
+    file_digests = {}
+    for image_path in df["image_path"].unique():
+        group = neighbour_paths(image_path, k)
+        # Key covers the bytes of every contributing slice plus the filter parameters
+        digest = hashlib.sha256(params_key.encode("utf-8"))
+        for p in group:
+            if p not in file_digests:
+                file_digests[p] = file_digest(p)
+            digest.update(file_digests[p].encode("utf-8"))
+        out_file = cache_path / f"{Path(image_path).stem}_{digest.hexdigest()[:16]}.png"
+        outputs[image_path] = str(out_file)
+        if not out_file.exists():
+            pending.append((image_path, group))
+
+    print(f"Preprocessing: {len(outputs) - len(pending)} cached, {len(pending)} to compute")
+
+    if pending:
+        # Chunks of slices share one batched NumPy pass; chunks run in parallel threads
+        chunks = [pending[i:i + CHUNK_SLICES] for i in range(0, len(pending), CHUNK_SLICES)]
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+            futures = [
+                pool.submit(process_chunk, [t for t, _ in chunk], [g for _, g in chunk], config)
+                for chunk in chunks
+            ]
+            for future in futures:
+                for image_path, image in future.result():
+                    pixels = np.round(image * 255).astype(np.uint8)
+                    Image.fromarray(pixels).save(outputs[image_path])
+
+    out_df = df.copy()
+    # Filtered slices share one cache directory, so pin each row's tomogram to its source
+    out_df["tomogram_id"] = df.apply(tomogram_key, axis=1)
+    out_df["source_image_path"] = df["image_path"]
+    out_df["image_path"] = df["image_path"].map(outputs)
+
+    out_csv = cache_path / f"{Path(dataset_csv).stem}_{params_key[:10]}.csv"
+    out_df.to_csv(out_csv, index=False)
+    print(f"Preprocessed dataset saved: {out_csv}")
+    return str(out_csv)
@@ -0,0 +1,224 @@
+# render_overlays.py
+import os
+import json
+import hashlib
+import argparse
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+from evaluate_segmentation_iou import robust_json_parser as parse_bbox_prediction, match_box
+from evaluate_spatial_accuracy import robust_json_parser as parse_coord_prediction, match_point
+
+# Bump when the drawing style changes so every overlay is re-rendered
+RENDER_VERSION = 1
+MANIFEST_NAME = ".overlay_manifest.json"
+
+MODELS = ['openai', 'gemini', 'claude', 'cascade']
+COLORS = {
+    "gt": (0, 230, 0),
+    "openai": (40, 90, 230),
+    "gemini": (230, 20, 20),
+    "claude": (0, 230, 230),
+    "cascade": (255, 160, 0),
+}
+
+def load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only ships a fixed-size bitmap font
+        return ImageFont.load_default()
+
+def build_tasks(df, experiment_dir, kind):
+    """
+    Groups overlays by slice so each worker decodes its base image once and reuses it
+    for every organelle and model.
+    """
+    gt_col = "gt_bboxes" if kind == "bbox" else "gt_coords"
+    parse = parse_bbox_prediction if kind == "bbox" else parse_coord_prediction
+    match = match_box if kind == "bbox" else match_point
+
+    tasks = []
+    for _, row in df.iterrows():
+        gt_dict = json.loads(row[gt_col])
+        predictions = {}
+        for model in MODELS:
+            pred_col = f"{model}_predictions"
+            if pred_col in df.columns:
+                predictions[model] = parse(row[pred_col])
+
+        overlays = []
+        for gt_label, gt_geom in gt_dict.items():
+            model_geoms = {
+                model: match(preds, gt_label, gt_geom) if preds else None
+                for model, preds in predictions.items()
+            }
+            overlays.append({
+                "label": gt_label,
+                "gt": gt_geom,
+                "models": model_geoms,
+                "out_file": str(experiment_dir / f"{row['image_id']}_{gt_label}_compare.png"),
+            })
+        tasks.append({"image_path": row["image_path"], "image_id": row["image_id"], "kind": kind, "overlays": overlays})
+    return tasks
+
+def overlay_hash(image_digest, overlay, kind):
+    payload = json.dumps({"v": RENDER_VERSION, "kind": kind, "image": image_digest,
+                          "label": overlay["label"], "gt": overlay["gt"], "models": overlay["models"]},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def draw_box(draw, box, color, width, label, font, label_above=False):
+    # Models sometimes return inverted corners; Pillow rejects those
+    ymin, ymax = sorted((box[0], box[2]))
+    xmin, xmax = sorted((box[1], box[3]))
+    draw.rectangle([xmin, ymin, xmax, ymax], outline=color, width=width)
+    if label_above:
+        draw.text((xmin + width, ymin - font.size - 4), label, fill=color, font=font)
+    else:
+        draw.text((xmin, ymax + 4), label, fill=color, font=font)
+
+def draw_point(draw, point, color, radius, width, label, font):
+    y, x = point
+    draw.ellipse([x - radius, y - radius, x + radius, y + radius], outline=color, width=width)
+    draw.line([x - radius, y, x + radius, y], fill=color, width=max(1, width // 2))
+    draw.line([x, y - radius, x, y + radius], fill=color, width=max(1, width // 2))
+    draw.text((x + radius + 4, y - font.size // 2), label, fill=color, font=font)
+
+def render_slice(task):
+    """
+    Worker: decodes one slice and writes the *_compare.png overlay for each pending organelle.
+    """
+    with Image.open(task["image_path"]) as img:
+        base = img.convert("RGB")
+
+    title_font = load_font(max(16, base.width // 28))
+    label_font = load_font(max(12, base.width // 56))
+
+    written = []
+    for overlay in task["overlays"]:
+        canvas = base.copy()
+        draw = ImageDraw.Draw(canvas)
+        title = f"Slice: {task['image_id']} | Target: {overlay['label'].capitalize()}"
+        draw.text((50, 20), title, fill=(255, 255, 255), font=title_font)
+
+        # Predictions first so the ground truth stays on top
+        for model, geom in overlay["models"].items():
+            if geom is None:
+                continue
+            if task["kind"] == "bbox":
+                draw_box(draw, geom, COLORS[model], 3, model.upper(), label_font)
+            else:
+                draw_point(draw, geom, COLORS[model], 14, 3, model.upper(), label_font)
+
+        gt_text = f"GT: {overlay['label'].capitalize()}"
+        if task["kind"] == "bbox":
+            draw_box(draw, overlay["gt"], COLORS["gt"], 6, gt_text, label_font, label_above=True)
+        else:
+            draw_point(draw, overlay["gt"], COLORS["gt"], 18, 5, gt_text, label_font)
+
+        canvas.save(overlay["out_file"])
+        written.append(overlay["out_file"])
+    return written
+
+def build_contact_sheet(tasks, out_file, thumb_size=256):
+    """
+    Downsampled grid of all overlays: one row per slice, one column per organelle.
+    """
+    n_cols = max(len(task["overlays"]) for task in tasks)
+    sheet = Image.new("RGB", (n_cols * thumb_size, len(tasks) * thumb_size), (0, 0, 0))
+    for r, task in enumerate(tasks):
+        for c, overlay in enumerate(task["overlays"]):
+            if not Path(overlay["out_file"]).exists():
+                continue
+            with Image.open(overlay["out_file"]) as img:
+                img.thumbnail((thumb_size, thumb_size))
+                sheet.paste(img, (c * thumb_size, r * thumb_size))
+    sheet.save(out_file)
+    return out_file
+
+def render_overlays(experiment_dir, kind="auto", workers=None, contact_sheet=False, force=False,
+                    summary_name="all_models_summary.csv"):
+    """
+    Renders z{N}_{organelle}_compare.png overlays (GT vs. every model) for one experiment,
+    driven by its all_models_summary.csv (or cascade_summary.csv via summary_name).
+    Slices are rendered in a process pool; overlays whose inputs (slice bytes, GT, parsed
+    predictions, style version) are unchanged are skipped via a hash manifest.
+    """
+    experiment_dir = Path(experiment_dir)
+    summary_file = experiment_dir / summary_name
+    if not summary_file.exists():
+        print(f"File not found: {summary_file}")
+        return
+
+    df = pd.read_csv(summary_file)
+    if kind == "auto":
+        kind = "bbox" if "gt_bboxes" in df.columns else "point"
+    if kind == "point" and "gt_coords" not in df.columns:
+        print(f"No gt_bboxes/gt_coords columns in {summary_file}; nothing to render.")
+        return
+
+    manifest_file = experiment_dir / MANIFEST_NAME
+    manifest = {} if force or not manifest_file.exists() else json.loads(manifest_file.read_text())
+
+    tasks = build_tasks(df, experiment_dir, kind)
+    pending, skipped = [], 0
+    digests = {}
+    for task in tasks:
+        if task["image_path"] not in digests:
+            try:
+                with open(task["image_path"], "rb") as f:
+                    digests[task["image_path"]] = hashlib.sha256(f.read()).hexdigest()
+            except OSError as e:
+                print(f"  WARNING: Skipping {task['image_id']}: {e}")
+                continue
+        stale = []
+        for overlay in task["overlays"]:
+            overlay["hash"] = overlay_hash(digests[task["image_path"]], overlay, kind)
+            name = Path(overlay["out_file"]).name
+            if manifest.get(name) == overlay["hash"] and Path(overlay["out_file"]).exists():
+                skipped += 1
+            else:
+                stale.append(overlay)
+        if stale:
+            pending.append({**task, "overlays": stale})
+
+    print(f"Overlays: {skipped} up to date, {sum(len(t['overlays']) for t in pending)} to render")
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(render_slice, task) for task in pending]
+            for task, future in zip(pending, futures):
+                # One bad row must not abort the batch; failed slices stay stale in the manifest
+                try:
+                    written = future.result()
+                except Exception as e:
+                    print(f"  WARNING: Could not render {task['image_id']}: {e}")
+                    continue
+                for overlay in task["overlays"]:
+                    manifest[Path(overlay["out_file"]).name] = overlay["hash"]
+                print(f"  Rendered {len(written)} overlays for {task['image_id']}")
+        manifest_file.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+
+    if contact_sheet:
+        sheet_file = experiment_dir / "contact_sheet.png"
+        if pending or not sheet_file.exists():
+            build_contact_sheet(tasks, sheet_file)
+            print(f" Contact sheet saved: {sheet_file}")
+    return experiment_dir
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render GT-vs-prediction overlays for experiments")
+    parser.add_argument("experiments", nargs="+", help="results/<EXPERIMENT> directories")
+    parser.add_argument("--kind", choices=["auto", "bbox", "point"], default="auto")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--contact-sheet", action="store_true", help="Also write a downsampled contact_sheet.png")
+    parser.add_argument("--force", action="store_true", help="Re-render even if overlays are up to date")
+    parser.add_argument("--summary", default="all_models_summary.csv",
+                        help="Summary file to draw from, e.g. cascade_summary.csv")
+    args = parser.parse_args()
+
+    for experiment in args.experiments:
+        render_overlays(experiment, kind=args.kind, workers=args.workers,
+                        contact_sheet=args.contact_sheet, force=args.force, summary_name=args.summary)
@@ -0,0 +1,124 @@
+# repair.py
+import json
+import time
+import pandas as pd
+from pathlib import Path
+from PIL import Image
+from run import build_model_registry, save_model_backup, load_run_state, is_filled, MODEL_TIERS
+from utils import (is_failed_prediction, estimate_text_tokens, estimate_image_tokens,
+                   RunBudget, BudgetExceeded)
+
+# Appended to the original prompt when re-querying rows that failed to parse
+STRICT_RETRY_SUFFIX = """
+RETRY_NOTICE: Your previous answer for this image could not be parsed.
+Respond with ONLY the raw JSON object in the exact format requested above.
+No markdown, no code fences, no explanations, no apologies."""
+
+MODELS = ['openai', 'gemini', 'claude']
+
+def find_failed_rows(summary_df, models=MODELS, structured=True, output_schema=None, skip_missing=False):
+    """
+    Scans the wide-format summary and returns {model_name: [row indices]} for failed cells.
+    skip_missing=True leaves empty (never-queried) cells out.
+    """
+    failed = {}
+    for model_name in models:
+        pred_col = f"{model_name}_predictions"
+        if pred_col not in summary_df.columns:
+            continue
+        mask = summary_df[pred_col].apply(lambda v: (is_filled(v) or not skip_missing)
+                                          and is_failed_prediction(v, structured, output_schema))
+        failed[model_name] = summary_df.index[mask].tolist()
+    return failed
+
+def repair_failed_rows(openai_client, gemini_model, claude_client, prompt_text, experiment_name,
+                       strict=True, retry_prompt_text=None, structured=True, output_schema=None,
+                       encodings=None, timeouts=None, budget=None):
+    """
+    Re-issues only the (model, image) requests that failed in an existing experiment
+    and merges the repaired predictions and their latencies back into results/<experiment>/ in place.
+    If output_schema is given, retries use the providers' structured-output mode.
+    encodings and timeouts are passed to build_model_registry as in run_all_models.
+    budget (optional RunBudget) is checked before every retry; the pass stops once it runs out.
+    Returns the number of failures that remain after the repair pass.
+    """
+    experiment_dir = Path("results") / experiment_name
+    summary_file = experiment_dir / "all_models_summary.csv"
+    if not summary_file.exists():
+        raise FileNotFoundError(f"Summary not found: {summary_file}. Run inference first.")
+
+    summary_df = pd.read_csv(summary_file)
+    # A sampled run leaves the unsampled slices empty on purpose; --resume queries those, not repair
+    sampled = load_run_state(experiment_dir).get("status") == "sampled"
+    failed = find_failed_rows(summary_df, structured=structured, output_schema=output_schema,
+                              skip_missing=sampled)
+    total_failed = sum(len(rows) for rows in failed.values())
+
+    print(f"Repair pass for: {experiment_dir}")
+    if sampled:
+        print(" Sampled experiment: slices outside the sample are left for --resume.")
+    print(f"Failed requests found: {total_failed}")
+    if total_failed == 0:
+        return 0
+
+    # Optionally tighten the prompt so the retry is less likely to return prose
+    if retry_prompt_text is None:
+        retry_prompt_text = prompt_text + STRICT_RETRY_SUFFIX if strict else prompt_text
+
+    models = build_model_registry(openai_client, gemini_model, claude_client, retry_prompt_text, output_schema,
+                                  encodings=encodings, timeouts=timeouts)
+    budget = budget or RunBudget()
+    prompt_tokens = estimate_text_tokens(retry_prompt_text)
+    if output_schema:
+        prompt_tokens += estimate_text_tokens(json.dumps(output_schema))
+    remaining = 0
+    stopped = False
+
+    for model_name, row_indices in failed.items():
+        if not row_indices or stopped:
+            remaining += len(row_indices)
+            continue
+        print(f"\n--- Repairing: {model_name.upper()} ({len(row_indices)} rows) ---")
+        pred_col = f"{model_name}_predictions"
+        latency_col = f"{model_name}_latency_s"
+        summary_df[pred_col] = summary_df[pred_col].astype(object)
+        if latency_col not in summary_df.columns:
+            summary_df[latency_col] = float("nan")
+        infer_fn = models[model_name]
+        full_name = MODEL_TIERS["flagship"][model_name]
+
+        for n, idx in enumerate(row_indices):
+            image_path = summary_df.at[idx, "image_path"]
+            with Image.open(image_path) as img:
+                input_tokens = prompt_tokens + estimate_image_tokens(full_name, *img.size)
+            try:
+                budget.check(full_name, input_tokens)
+            except BudgetExceeded as e:
+                print(f"\n Budget stop before {model_name} / {image_path}: {e}")
+                remaining += len(row_indices) - n
+                stopped = True
+                break
+            print(f"  [row {idx}] Re-querying: {image_path}")
+            start = time.perf_counter()
+            try:
+                preds = infer_fn(image_path)
+            except Exception as e:
+                print(f"Error for {image_path} with {model_name}: {e}")
+                preds = f"ERROR: {e}"
+
+            # Store the same string form that to_csv writes for a fresh run
+            summary_df.at[idx, pred_col] = str(preds)
+            # The stale latency would skew planner calibration
+            summary_df.at[idx, latency_col] = time.perf_counter() - start
+            budget.charge(full_name, input_tokens, estimate_text_tokens(preds))
+            if is_failed_prediction(preds, structured, output_schema):
+                remaining += 1
+
+        save_model_backup(summary_df, experiment_dir, model_name)
+
+    summary_df.to_csv(summary_file, index=False)
+
+    print(f"\n Repaired {total_failed - remaining}/{total_failed} requests. Remaining failures: {remaining}")
+    print(f" Est. spend: ${budget.spent_usd:.4f} | {budget.spent_tokens:,} tokens | {budget.requests} requests")
+    print(f" Summary updated in place: {summary_file}")
+    return remaining
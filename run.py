@@ -1,18 +1,105 @@
 # run.py
+import json
+import time
 import pandas as pd
 from pathlib import Path
+from PIL import Image
+from utils import (negotiate_encoding, estimate_text_tokens, estimate_image_tokens,
+                   RunBudget, BudgetExceeded, stage, is_failed_prediction)
+from adaptive import AdaptiveSampler
+from hedging import HedgedCaller, write_hedging_report
 from llm import analyze_image_openai, analyze_image_gemini, analyze_image_claude
 
-def run_all_models(openai_client, gemini_model, claude_client, prompt_text, experiment_name, dataset_csv="demo_dataset/annotations_segmenetation.csv"):
+# Model identifiers per provider for each pricing tier
+MODEL_TIERS = {
+    "flagship": {"openai": "gpt-4o", "gemini": "gemini-2.5-pro", "claude": "claude-sonnet-4-20250514"},
+    "cheap": {"openai": "gpt-4o-mini", "gemini": "gemini-2.5-flash", "claude": "claude-3-5-haiku-20241022"},
+}
+
+# Per-provider request deadlines (seconds), passed to each SDK's timeout option
+REQUEST_TIMEOUTS = {"openai": 120, "gemini": 180, "claude": 120}
+
+# Spend and progress of the last run_all_models call, used for budget stops and resume
+RUN_STATE_FILE = "run_state.json"
+
+def build_model_registry(openai_client, gemini_model, claude_client, prompt_text, output_schema=None, tier="flagship",
+                         encodings=None, timeouts=None):
+    """
+    Maps model identifiers to single-image inference callables bound to one prompt.
+    Shared by the full inference run, the repair pass and the cascade router.
+    Gemini binds the model at init time, so gemini_model must already match the tier.
+    encodings (optional) maps provider -> image encoding config (see utils/image_codec.py).
+    timeouts (optional) overrides REQUEST_TIMEOUTS per provider.
+    """
+    names = MODEL_TIERS[tier]
+    encodings = encodings or {}
+    enc = {provider: negotiate_encoding(provider, encodings.get(provider)) for provider in names}
+    deadline = {**REQUEST_TIMEOUTS, **(timeouts or {})}
+    return {
+        "openai": lambda path: analyze_image_openai(openai_client, path, prompt_text, output_schema=output_schema,
+                                                    model=names["openai"], encoding=enc["openai"],
+                                                    timeout=deadline["openai"]),
+        "gemini": lambda path: analyze_image_gemini(gemini_model, path, prompt_text, output_schema=output_schema,
+                                                    encoding=enc["gemini"], timeout=deadline["gemini"]),
+        "claude": lambda path: analyze_image_claude(claude_client, path, prompt_text, output_schema=output_schema,
+                                                    model=names["claude"], encoding=enc["claude"],
+                                                    timeout=deadline["claude"]),
+    }
+
+def save_model_backup(summary_df, experiment_dir, model_name):
+    """
+    Writes the per-model backup CSV ({model}_results.csv) from the wide summary.
+    """
+    individual_out = Path(experiment_dir) / f"{model_name}_results.csv"
+    # Include gt_bboxes in the backup if it exists
+    cols_to_save = ["image_id", f"{model_name}_predictions"]
+    if "gt_bboxes" in summary_df.columns:
+        cols_to_save.insert(1, "gt_bboxes")
+
+    summary_df[cols_to_save].to_csv(individual_out, index=False)
+    return individual_out
+
+def load_run_state(experiment_dir):
+    """
+    Reads run_state.json (spend so far, completion status, remaining requests); {} if absent.
+    """
+    state_file = Path(experiment_dir) / RUN_STATE_FILE
+    if not state_file.exists():
+        return {}
+    return json.loads(state_file.read_text())
+
+def is_filled(value):
+    # Missing cells come back from read_csv as NaN; predictions themselves may be dicts/lists
+    return value is not None and not (isinstance(value, float) and pd.isna(value))
+
+def run_all_models(openai_client, gemini_model, claude_client, prompt_text, experiment_name, dataset_csv="demo_dataset/annotations_segmenetation.csv",
+                   output_schema=None, encodings=None, budget=None, resume=False, sampling=None, timeouts=None,
+                   hedging=None, structured=True):
     """
     Executes model inference and saves results into a wide-format CSV.
     Supports both Coordinate Detection and Segmentation modes.
+    output_schema (optional) constrains every provider to the prompt's declared JSON schema.
+    encodings (optional) selects the image codec per provider, e.g. {"openai": {"codec": "jpeg", "quality": 90}}.
+    Per-request wall time is recorded in {model}_latency_s.
+    budget (optional RunBudget) is a hard token/cost ceiling: the run stops before the request
+    that would exceed it, leaving a partial summary and run_state.json. With resume=True, cells
+    already filled in an existing summary are kept and the spend recorded in run_state.json
+    counts towards the budget.
+    sampling (optional dict, see adaptive.DEFAULT_SAMPLING; {} for defaults) queries slices in
+    stratified batches and stops once the running metric CIs are tight enough; unsampled rows
+    stay empty and the evaluators skip them.
+    timeouts (optional) overrides the per-provider request deadlines in REQUEST_TIMEOUTS.
+    hedging (optional dict, see hedging.DEFAULT_HEDGING; {} for defaults) re-issues calls that
+    outlive a latency percentile and keeps the first valid answer; duplicates are billed to
+    the budget and summarized in hedging_report.csv. Validity follows the repair pass: with
+    structured=True (JSON prompts) refusals and non-conforming answers lose the race too.
     """
     # 1. Check if dataset exists
     if not Path(dataset_csv).exists():
         raise FileNotFoundError(f"Dataset not found: {dataset_csv}. Make sure to use the 1011 Master version.")
 
-    df = pd.read_csv(dataset_csv)
+    with stage("load"):
+        df = pd.read_csv(dataset_csv)
     
     # 2. Create the output directory
     results_base = Path("results")
@@ -23,46 +110,148 @@ def run_all_models(openai_client, gemini_model, claude_client, prompt_text, expe
     print(f"Using Prompt: {experiment_name}")
 
     # Map model identifiers to their corresponding inference functions
-    models = {
-        "openai": lambda path: analyze_image_openai(openai_client, path, prompt_text),
-        "gemini": lambda path: analyze_image_gemini(gemini_model, path, prompt_text),
-        "claude": lambda path: analyze_image_claude(claude_client, path, prompt_text),
-    }
+    models = build_model_registry(openai_client, gemini_model, claude_client, prompt_text, output_schema,
+                                  encodings=encodings, timeouts=timeouts)
+    callers = {}
+    if hedging is not None:
+        is_valid = lambda preds: not is_failed_prediction(preds, structured, output_schema)
+        callers = {model_name: HedgedCaller(infer_fn, model_name, hedging, is_valid=is_valid)
+                   for model_name, infer_fn in models.items()}
+    hedge_costs = {model_name: 0.0 for model_name in models}
 
     # Initialize summary dataframe by copying the original dataset
     summary_df = df.copy()
-
-    for model_name, infer_fn in models.items():
-        print(f"\n--- Running Inference: {model_name.upper()} ---")
-        model_predictions = []
-
-        for i, row in df.iterrows():
-            image_path = row["image_path"]
-            print(f"  [{i+1}/{len(df)}] Processing: {image_path}")
-
-            try:
-                # The prompt_text passed here will be the BBox prompt from collection.txt
-                preds = infer_fn(image_path)
-            except Exception as e:
-                print(f"Error for {image_path} with {model_name}: {e}")
-                preds = f"ERROR: {e}"
-
-            model_predictions.append(preds)
-
-        summary_df[f"{model_name}_predictions"] = model_predictions
-        
-        # Backup individual results
-        individual_out = experiment_dir / f"{model_name}_results.csv"
-        # Include gt_bboxes in the backup if it exists
-        cols_to_save = ["image_id", f"{model_name}_predictions"]
-        if "gt_bboxes" in summary_df.columns:
-            cols_to_save.insert(1, "gt_bboxes")
-            
-        summary_df[cols_to_save].to_csv(individual_out, index=False)
-
-    # --- Final Step: Save the master summary ---
     summary_file = experiment_dir / "all_models_summary.csv"
-    summary_df.to_csv(summary_file, index=False)
-    
-    print(f"\n Wide-format summary saved: {summary_file}")
-    return summary_file
\ No newline at end of file
+    budget = budget or RunBudget()
+
+    if resume and summary_file.exists():
+        with stage("load"):
+            previous_df = pd.read_csv(summary_file)
+        if previous_df["image_path"].tolist() == df["image_path"].tolist():
+            for col in previous_df.columns:
+                if col.endswith(("_predictions", "_latency_s")):
+                    summary_df[col] = previous_df[col]
+            budget.restore(load_run_state(experiment_dir))
+            print(f"Resuming: {budget.requests} requests (${budget.spent_usd:.4f}) already spent")
+        else:
+            print(f"WARNING: {summary_file} does not match {dataset_csv}; starting from scratch")
+
+    # The prompt (and the schema, which providers bill as input) is sent with every image
+    prompt_tokens = estimate_text_tokens(prompt_text)
+    if output_schema:
+        prompt_tokens += estimate_text_tokens(json.dumps(output_schema))
+    image_sizes = {}
+    stopped_at = None
+
+    # Slices are queried batch by batch; without sampling the whole dataset is one batch
+    order = list(df.index)
+    batch_size = max(1, len(order))
+    sampler = None
+    if sampling is not None:
+        sampler = AdaptiveSampler(df, models, sampling)
+        order, batch_size = sampler.order, sampler.batch_size
+
+    predictions = {m: summary_df[f"{m}_predictions"].tolist() if f"{m}_predictions" in summary_df else [None] * len(df)
+                   for m in models}
+    latencies = {m: summary_df[f"{m}_latency_s"].tolist() if f"{m}_latency_s" in summary_df else [None] * len(df)
+                 for m in models}
+
+    for batch_start in range(0, len(order), batch_size):
+        batch = order[batch_start:batch_start + batch_size]
+        if sampler is not None:
+            print(f"\n--- Sampling batch {batch_start // batch_size + 1}: slices "
+                  f"{batch_start + 1}-{batch_start + len(batch)} of {len(order)} ---")
+
+        for model_name, infer_fn in models.items():
+            print(f"\n--- Running Inference: {model_name.upper()} ---")
+            model_predictions, model_latencies = predictions[model_name], latencies[model_name]
+            full_name = MODEL_TIERS["flagship"][model_name]
+
+            for i in batch:
+                image_path = df.at[i, "image_path"]
+                if is_filled(model_predictions[i]):
+                    continue
+                print(f"  [{i+1}/{len(df)}] Processing: {image_path}")
+
+                if image_path not in image_sizes:
+                    with stage("load"), Image.open(image_path) as img:
+                        image_sizes[image_path] = img.size
+                input_tokens = prompt_tokens + estimate_image_tokens(full_name, *image_sizes[image_path])
+                try:
+                    budget.check(full_name, input_tokens)
+                except BudgetExceeded as e:
+                    print(f"\n Budget stop before {model_name} / {image_path}: {e}")
+                    stopped_at = {"model": model_name, "image_path": image_path}
+                    break
+
+                start = time.perf_counter()
+                attempts = 1
+                if callers:
+                    # Only hedge while the budget could also pay for the duplicate
+                    try:
+                        budget.check(full_name, 2 * input_tokens, 2 * budget.max_output_tokens(full_name))
+                        allow_hedge = True
+                    except BudgetExceeded:
+                        allow_hedge = False
+                    preds, attempts = callers[model_name](image_path, allow_hedge=allow_hedge)
+                else:
+                    try:
+                        # The prompt_text passed here will be the BBox prompt from collection.txt
+                        preds = infer_fn(image_path)
+                    except Exception as e:
+                        print(f"Error for {image_path} with {model_name}: {e}")
+                        preds = f"ERROR: {e}"
+
+                model_predictions[i] = preds
+                model_latencies[i] = time.perf_counter() - start
+                output_tokens = estimate_text_tokens(preds)
+                budget.charge(full_name, input_tokens, output_tokens)
+                # Hedged duplicates are billed like full requests
+                for _ in range(attempts - 1):
+                    hedge_costs[model_name] += budget.charge(full_name, input_tokens, output_tokens)
+
+            summary_df[f"{model_name}_predictions"] = model_predictions
+            summary_df[f"{model_name}_latency_s"] = model_latencies
+
+            # Backup individual results
+            with stage("write"):
+                save_model_backup(summary_df, experiment_dir, model_name)
+            if stopped_at:
+                break
+
+        if stopped_at or (sampler and sampler.update(summary_df, batch)):
+            break
+
+    # --- Final Step: Save the master summary (partial if the budget ran out) ---
+    with stage("write"):
+        summary_df.to_csv(summary_file, index=False)
+
+    remaining = sum(
+        (~summary_df[f"{m}_predictions"].apply(is_filled)).sum() if f"{m}_predictions" in summary_df else len(df)
+        for m in models
+    )
+    state = {
+        "experiment": experiment_name,
+        "dataset_csv": str(dataset_csv),
+        "status": "budget_exhausted" if stopped_at else ("sampled" if sampler and sampler.stop_reason else "complete"),
+        "stopped_at": stopped_at,
+        "remaining_requests": int(remaining),
+        "sampled_slices": sampler.sampled if sampler else None,
+        "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+        **budget.to_dict(),
+    }
+    with stage("write"):
+        (experiment_dir / RUN_STATE_FILE).write_text(json.dumps(state, indent=2))
+        if sampler:
+            sampler.write_report(experiment_dir)
+        if callers:
+            write_hedging_report(callers, hedge_costs, latencies, experiment_dir)
+    for caller in callers.values():
+        caller.close()
+
+    print(f"\n Est. spend: ${budget.spent_usd:.4f} | {budget.spent_tokens:,} tokens | {budget.requests} requests")
+    if stopped_at:
+        print(f" Partial summary saved: {summary_file} ({remaining} requests left; rerun with resume to continue)")
+    else:
+        print(f"\n Wide-format summary saved: {summary_file}")
+    return summary_file
@@ -1,6 +1,26 @@
 # utils/__init__.py
 
 from .config_loader import load_api_keys
-from .prompt_manager import get_prompt_by_id
+from .prompt_manager import get_prompt_by_id, get_schema_by_id
+from .schema_validator import (compile_schema, validate_output, parse_structured_response,
+                               parse_structured_prediction, is_failed_prediction)
+from .slices import parse_z_index, tomogram_key, stratified_order
+from .bootstrap import bootstrap_ci, paired_bootstrap, paired_model_comparison, format_ci
+from .image_codec import encode_image, negotiate_encoding, encoding_tag
+from .slice_store import SharedSliceStore
+from .pricing import (MODEL_PRICING, provider_for_model, estimate_text_tokens,
+                      estimate_image_tokens, estimate_call_cost)
+from .profiler import StageProfiler, stage, enable_profiling, disable_profiling, write_profile
+from .budget import RunBudget, BudgetExceeded, DEFAULT_OUTPUT_TOKENS, MAX_OUTPUT_TOKENS
 
-__all__ = ["load_api_keys", "get_prompt_by_id"]
\ No newline at end of file
+__all__ = ["load_api_keys", "get_prompt_by_id", "get_schema_by_id",
+           "compile_schema", "validate_output", "parse_structured_response",
+           "parse_structured_prediction", "is_failed_prediction",
+           "MODEL_PRICING", "provider_for_model", "estimate_text_tokens",
+           "estimate_image_tokens", "estimate_call_cost",
+           "RunBudget", "BudgetExceeded", "DEFAULT_OUTPUT_TOKENS", "MAX_OUTPUT_TOKENS",
+           "parse_z_index", "tomogram_key", "stratified_order",
+           "bootstrap_ci", "paired_bootstrap", "paired_model_comparison", "format_ci",
+           "encode_image", "negotiate_encoding", "encoding_tag",
+           "SharedSliceStore",
+           "StageProfiler", "stage", "enable_profiling", "disable_profiling", "write_profile"]
\ No newline at end of file
@@ -0,0 +1,104 @@
+# utils/bootstrap.py
+import os
+import itertools
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+N_RESAMPLES = 10000
+CONFIDENCE = 0.95
+# Upper bound on resample-index elements in flight across all threads
+# (~40 MB of int32 indices + an 80 MB float64 gather)
+MAX_CHUNK_ELEMENTS = 10_000_000
+MAX_WORKERS = 4
+# Data with at most this many distinct (paired) values is resampled as multinomial counts
+MAX_DISTINCT = 64
+
+def _resampled_means(seed, columns, n_resamples):
+    """
+    Returns the resampled means of every column using the SAME resamples, which is what
+    makes paired comparisons valid. Binary or otherwise low-cardinality data (recall hits)
+    is resampled exactly as multinomial counts over its distinct rows, in O(B * distinct).
+    Other data draws (B, n) index matrices chunk by chunk; chunks use independent child
+    RNGs and run on a small thread pool (NumPy releases the GIL for the gather and
+    reduction), so results are reproducible for a given seed.
+    """
+    n = len(columns[0])
+    distinct, counts = np.unique(np.column_stack(columns), axis=0, return_counts=True)
+    if len(distinct) <= MAX_DISTINCT:
+        rng = np.random.default_rng(seed)
+        draws = rng.multinomial(n, counts / n, size=n_resamples)
+        resampled = draws @ distinct / n
+        return [resampled[:, j] for j in range(len(columns))]
+
+    means = [np.empty(n_resamples) for _ in columns]
+    workers = min(MAX_WORKERS, os.cpu_count() or 1)
+    chunk = max(1, MAX_CHUNK_ELEMENTS // (n * workers))
+    starts = list(range(0, n_resamples, chunk))
+    child_seeds = np.random.SeedSequence(seed).spawn(len(starts))
+
+    def fill(start, child_seed):
+        rng = np.random.default_rng(child_seed)
+        size = min(chunk, n_resamples - start)
+        idx = rng.integers(0, n, size=(size, n), dtype=np.int32)
+        for out, values in zip(means, columns):
+            out[start:start + size] = values[idx].mean(axis=1)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fill, starts, child_seeds))
+    return means
+
+def bootstrap_ci(values, n_resamples=N_RESAMPLES, confidence=CONFIDENCE, seed=0):
+    """
+    Percentile bootstrap confidence interval for the mean of `values` (NaNs ignored).
+    Returns (point_estimate, lower, upper); all NaN when there is no data.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return float("nan"), float("nan"), float("nan")
+
+    (means,) = _resampled_means(seed, [values], n_resamples)
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(means, [alpha, 1 - alpha])
+    return float(values.mean()), float(lower), float(upper)
+
+def paired_bootstrap(values_a, values_b, n_resamples=N_RESAMPLES, confidence=CONFIDENCE, seed=0):
+    """
+    Paired bootstrap of mean(a) - mean(b) over aligned units (pairs with a NaN are dropped).
+    Returns a dict with the observed difference, its confidence interval and a two-sided
+    bootstrap p-value for the null hypothesis of no difference.
+    """
+    a = np.asarray(values_a, dtype=np.float64)
+    b = np.asarray(values_b, dtype=np.float64)
+    keep = ~(np.isnan(a) | np.isnan(b))
+    a, b = a[keep], b[keep]
+    if len(a) == 0:
+        return {"n": 0, "diff": float("nan"), "lower": float("nan"), "upper": float("nan"), "p_value": float("nan")}
+
+    means_a, means_b = _resampled_means(seed, [a, b], n_resamples)
+    diffs = means_a - means_b
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(diffs, [alpha, 1 - alpha])
+    p_value = min(1.0, 2 * min((diffs <= 0).mean(), (diffs >= 0).mean()))
+    return {"n": int(len(a)), "diff": float(a.mean() - b.mean()),
+            "lower": float(lower), "upper": float(upper), "p_value": float(p_value)}
+
+def paired_model_comparison(df, unit_cols, value_col, model_col="model", **kwargs):
+    """
+    Runs paired_bootstrap for every pair of models in a long-format results frame.
+    Units (e.g. image + organelle) are aligned across models via unit_cols.
+    """
+    wide = df.pivot_table(index=unit_cols, columns=model_col, values=value_col, aggfunc="mean")
+    comparisons = []
+    for model_a, model_b in itertools.combinations(wide.columns, 2):
+        result = paired_bootstrap(wide[model_a].to_numpy(), wide[model_b].to_numpy(), **kwargs)
+        comparisons.append({"model_a": model_a, "model_b": model_b, **result})
+    return comparisons
+
+def format_ci(point, lower, upper, scale=1.0, unit="", decimals=2):
+    """
+    Formats 'point [lower, upper]' for the evaluation printouts.
+    """
+    if np.isnan(point):
+        return "N/A"
+    return f"{point*scale:.{decimals}f}{unit} [{lower*scale:.{decimals}f}, {upper*scale:.{decimals}f}]"
@@ -0,0 +1,75 @@
+# utils/budget.py
+from .pricing import estimate_call_cost, provider_for_model
+
+# Expected response size when nothing better is known (a few structured detections)
+DEFAULT_OUTPUT_TOKENS = 400
+
+# Output cap the single-image clients send with every request (max_tokens / max_output_tokens)
+MAX_OUTPUT_TOKENS = {"openai": 1000, "gemini": 8192, "claude": 1000}
+
+class BudgetExceeded(RuntimeError):
+    """Raised when the next request would push a run past its token or cost budget."""
+
+class RunBudget:
+    """
+    Hard token/cost ceiling for an experiment run. Every request is checked before it is
+    sent, reserving its estimated input tokens plus the client's output cap
+    (MAX_OUTPUT_TOKENS), so the ceiling is never crossed; it is then charged with the
+    estimated cost of the actual response.
+    Leave max_usd and max_tokens as None to only track spend.
+    """
+
+    def __init__(self, max_usd=None, max_tokens=None):
+        self.max_usd = max_usd
+        self.max_tokens = max_tokens
+        self.spent_usd = 0.0
+        self.spent_tokens = 0
+        self.output_tokens = 0
+        self.requests = 0
+
+    def restore(self, state):
+        """
+        Carries spend over from a previous run_state.json so a resumed run shares one budget.
+        """
+        self.spent_usd = state.get("spent_usd", 0.0)
+        self.spent_tokens = state.get("spent_tokens", 0)
+        self.output_tokens = state.get("output_tokens", 0)
+        self.requests = state.get("requests", 0)
+
+    def max_output_tokens(self, model_name):
+        """
+        Largest response the clients allow for this model: the worst case a request can bill.
+        """
+        return MAX_OUTPUT_TOKENS[provider_for_model(model_name)]
+
+    def check(self, model_name, input_tokens, output_tokens=None):
+        """
+        Raises BudgetExceeded if this request could take the run over either limit.
+        By default the model's full output cap is reserved.
+        """
+        output_tokens = self.max_output_tokens(model_name) if output_tokens is None else output_tokens
+        cost = estimate_call_cost(model_name, input_tokens, output_tokens)
+        if self.max_usd is not None and self.spent_usd + cost > self.max_usd:
+            raise BudgetExceeded(f"cost budget ${self.max_usd:g} reached "
+                                 f"(spent ${self.spent_usd:.4f}, next request ~${cost:.4f})")
+        if self.max_tokens is not None and self.spent_tokens + input_tokens + output_tokens > self.max_tokens:
+            raise BudgetExceeded(f"token budget {self.max_tokens:,} reached "
+                                 f"(spent {self.spent_tokens:,}, next request ~{input_tokens + output_tokens:,})")
+        return cost
+
+    def charge(self, model_name, input_tokens, output_tokens):
+        """
+        Records one completed request and returns its estimated cost.
+        """
+        # The provider truncates at the cap, so a larger text estimate is estimator error
+        output_tokens = min(output_tokens, self.max_output_tokens(model_name))
+        cost = estimate_call_cost(model_name, input_tokens, output_tokens)
+        self.spent_usd += cost
+        self.spent_tokens += input_tokens + output_tokens
+        self.output_tokens += output_tokens
+        self.requests += 1
+        return cost
+
+    def to_dict(self):
+        return {"max_usd": self.max_usd, "max_tokens": self.max_tokens, "spent_usd": self.spent_usd,
+                "spent_tokens": self.spent_tokens, "output_tokens": self.output_tokens, "requests": self.requests}
@@ -0,0 +1,88 @@
+# utils/image_codec.py
+import io
+import os
+import json
+from functools import lru_cache
+from pathlib import Path
+from PIL import Image
+
+CODEC_MEDIA_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+}
+
+# Image formats each provider accepts for inline (base64/blob) uploads
+PROVIDER_CODECS = {
+    "openai": {"png", "jpeg", "webp"},
+    "gemini": {"png", "jpeg", "webp"},
+    "claude": {"png", "jpeg", "webp"},
+}
+
+def encoding_tag(encoding):
+    """
+    Short label for an encoding config, e.g. 'png', 'webp_lossless', 'jpeg_q85'.
+    """
+    if not encoding:
+        return "png"
+    codec = encoding["codec"]
+    if encoding.get("lossless"):
+        return f"{codec}_lossless"
+    if "quality" in encoding:
+        return f"{codec}_q{encoding['quality']}"
+    return codec
+
+def negotiate_encoding(provider, encoding):
+    """
+    Returns the encoding to use for a provider, falling back to PNG if the requested
+    codec is not accepted by that provider.
+    """
+    if not encoding:
+        return None
+    codec = encoding.get("codec", "png").lower()
+    if codec not in CODEC_MEDIA_TYPES:
+        raise ValueError(f"Unsupported codec '{codec}'. Choose from {sorted(CODEC_MEDIA_TYPES)}")
+    if codec not in PROVIDER_CODECS.get(provider, {"png"}):
+        print(f"WARNING: {provider} does not accept {codec}; falling back to png")
+        return None
+    return {**encoding, "codec": codec}
+
+def encode_image(image_path, encoding=None):
+    """
+    Reads a slice and returns (image_bytes, media_type) for the requested encoding.
+    encoding=None sends the PNG on disk unchanged (the original behaviour). Otherwise it is
+    a dict such as {"codec": "webp", "lossless": True} or {"codec": "jpeg", "quality": 85}.
+    """
+    if not encoding or (encoding.get("codec") == "png" and len(encoding) == 1
+                        and Path(image_path).suffix.lower() == ".png"):
+        with open(image_path, "rb") as f:
+            return f.read(), "image/png"
+
+    # The same slice is usually sent to all three providers; re-encode it only once
+    return _encode_cached(str(image_path), os.path.getmtime(image_path), json.dumps(encoding, sort_keys=True))
+
+@lru_cache(maxsize=32)
+def _encode_cached(image_path, mtime, encoding_json):
+    encoding = json.loads(encoding_json)
+    codec = encoding["codec"]
+    with Image.open(image_path) as img:
+        # Tomogram slices are 8-bit grayscale; keep L to avoid tripling the payload
+        if img.mode not in ("L", "RGB"):
+            img = img.convert("L" if img.mode in ("I", "I;16", "F", "LA") else "RGB")
+
+        buffer = io.BytesIO()
+        if codec == "png":
+            img.save(buffer, format="PNG", optimize=True, compress_level=encoding.get("compress_level", 9))
+        elif codec == "webp":
+            # For lossless WebP, quality is compression effort; method 6 / effort 100 takes a minute per slice
+            if encoding.get("lossless"):
+                img.save(buffer, format="WEBP", lossless=True, quality=encoding.get("effort", 50),
+                         method=encoding.get("method", 4))
+            else:
+                img.save(buffer, format="WEBP", quality=encoding.get("quality", 90), method=encoding.get("method", 4))
+        elif codec == "jpeg":
+            img.save(buffer, format="JPEG", quality=encoding.get("quality", 90), optimize=True)
+        else:
+            raise ValueError(f"Unsupported codec '{codec}'")
+
+    return buffer.getvalue(), CODEC_MEDIA_TYPES[codec]
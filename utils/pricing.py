@@ -0,0 +1,70 @@
+# utils/pricing.py
+import math
+
+# List prices in USD per 1M tokens: (input, output)
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+}
+
+# OpenAI bills images per 512px tile on top of a base charge; mini models use larger multipliers
+OPENAI_TILE_TOKENS = {
+    "gpt-4o": (85, 170),
+    "gpt-4o-mini": (2833, 5667),
+}
+
+def provider_for_model(model_name):
+    """
+    Maps a model identifier to its provider key ('openai', 'gemini' or 'claude').
+    """
+    name = model_name.lower()
+    if name.startswith(("gpt", "o1", "o3", "o4")):
+        return "openai"
+    if name.startswith("gemini"):
+        return "gemini"
+    if name.startswith("claude"):
+        return "claude"
+    raise ValueError(f"Unknown provider for model '{model_name}'")
+
+def estimate_text_tokens(text):
+    """
+    Rough token count for prompt/response text (~4 characters per token).
+    """
+    return math.ceil(len(str(text)) / 4)
+
+def estimate_image_tokens(model_name, width, height):
+    """
+    Applies each provider's published image-token formula to the slice dimensions.
+    """
+    provider = provider_for_model(model_name)
+
+    if provider == "openai":
+        # Fit within 2048x2048, then scale the shortest side down to 768px
+        scale = min(1.0, 2048 / max(width, height))
+        w, h = width * scale, height * scale
+        scale = min(1.0, 768 / min(w, h))
+        w, h = w * scale, h * scale
+        tiles = math.ceil(w / 512) * math.ceil(h / 512)
+        base, per_tile = OPENAI_TILE_TOKENS.get(model_name, OPENAI_TILE_TOKENS["gpt-4o"])
+        return base + per_tile * tiles
+
+    if provider == "claude":
+        # Images with a long edge above 1568px are downscaled before tokenization
+        scale = min(1.0, 1568 / max(width, height))
+        return math.ceil((width * scale) * (height * scale) / 750)
+
+    # Gemini: small images cost a flat 258 tokens, larger ones 258 per 768x768 tile
+    if width <= 384 and height <= 384:
+        return 258
+    return 258 * math.ceil(width / 768) * math.ceil(height / 768)
+
+def estimate_call_cost(model_name, input_tokens, output_tokens):
+    """
+    Estimated USD cost of one request from its token counts.
+    """
+    input_price, output_price = MODEL_PRICING[model_name]
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
@@ -1,5 +1,6 @@
 # utils/prompt_manager.py
 import re
+import json
 
 def get_prompt_by_id(file_path, prompt_id):
     """
@@ -32,4 +33,27 @@ def get_prompt_by_id(file_path, prompt_id):
         return None
     except Exception as e:
         print(f"ERROR: Failed to retrieve prompt: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def get_schema_by_id(file_path, prompt_id):
+    """
+    Extracts the optional output schema declared for a prompt.
+    Schemas live in the same collection file under a [PROMPT_ID:schema] marker
+    and contain a JSON Schema object. Returns None if no schema is declared.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+
+        pattern = rf"\[{prompt_id}:schema\]\n(.*?)(?=\n\[|$)"
+        match = re.search(pattern, content, re.DOTALL)
+        if not match:
+            return None
+        return json.loads(match.group(1).strip())
+
+    except FileNotFoundError:
+        print(f"ERROR: Prompt collection file not found at {file_path}")
+        return None
+    except Exception as e:
+        print(f"ERROR: Failed to load output schema for '{prompt_id}': {e}")
+        return None
@@ -0,0 +1,154 @@
+# utils/schema_validator.py
+import ast
+import json
+import re
+import pandas as pd
+from functools import lru_cache
+
+# JSON Schema type names mapped to the Python types produced by json.loads
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+def _compile(schema):
+    """
+    Turns a (subset of) JSON Schema into a single validation closure.
+    Supported keywords: type, properties, required, additionalProperties,
+    items, minItems, maxItems, minimum, maximum, enum, anyOf.
+    """
+    checks = []
+
+    schema_type = schema.get("type")
+    if schema_type is not None:
+        types = schema_type if isinstance(schema_type, list) else [schema_type]
+        type_fns = [_TYPE_CHECKS[t] for t in types]
+        checks.append(lambda v: any(fn(v) for fn in type_fns))
+
+    if "anyOf" in schema:
+        option_fns = [_compile(option) for option in schema["anyOf"]]
+        checks.append(lambda v: any(fn(v) for fn in option_fns))
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+        checks.append(lambda v: v in allowed)
+
+    if "minimum" in schema:
+        low = schema["minimum"]
+        checks.append(lambda v: not isinstance(v, (int, float)) or v >= low)
+    if "maximum" in schema:
+        high = schema["maximum"]
+        checks.append(lambda v: not isinstance(v, (int, float)) or v <= high)
+
+    if "minItems" in schema:
+        min_items = schema["minItems"]
+        checks.append(lambda v: not isinstance(v, list) or len(v) >= min_items)
+    if "maxItems" in schema:
+        max_items = schema["maxItems"]
+        checks.append(lambda v: not isinstance(v, list) or len(v) <= max_items)
+
+    if "items" in schema:
+        item_fn = _compile(schema["items"])
+        checks.append(lambda v: not isinstance(v, list) or all(item_fn(item) for item in v))
+
+    properties = {name: _compile(sub) for name, sub in schema.get("properties", {}).items()}
+    required = list(schema.get("required", []))
+    allow_extra = schema.get("additionalProperties", True) is not False
+
+    if properties or required or not allow_extra:
+        def check_object(v):
+            if not isinstance(v, dict):
+                return True
+            if any(name not in v for name in required):
+                return False
+            for key, value in v.items():
+                prop_fn = properties.get(key)
+                if prop_fn is None:
+                    if not allow_extra:
+                        return False
+                elif not prop_fn(value):
+                    return False
+            return True
+        checks.append(check_object)
+
+    return lambda v: all(check(v) for check in checks)
+
+@lru_cache(maxsize=64)
+def _compile_cached(schema_json):
+    return _compile(json.loads(schema_json))
+
+def compile_schema(schema):
+    """
+    Returns a fast validator function (value -> bool) for the given schema dict.
+    Compiled validators are cached, so repeated calls per response are cheap.
+    """
+    return _compile_cached(json.dumps(schema, sort_keys=True))
+
+def validate_output(data, schema):
+    """
+    Checks a parsed model response against its declared output schema.
+    """
+    return compile_schema(schema)(data)
+
+def parse_structured_response(text, schema):
+    """
+    Parses a raw model response as JSON and validates it against the schema.
+    Returns the parsed object, or None for non-conforming payloads.
+    """
+    try:
+        # Some providers still wrap structured output in a code fence
+        clean_text = re.sub(r'```[a-z]*\n?|```', '', text).strip()
+        data = json.loads(clean_text)
+    except Exception:
+        return None
+    return data if validate_output(data, schema) else None
+
+def parse_structured_prediction(raw_value):
+    """
+    Returns the parsed dict/list stored in a prediction cell, or None when the cell
+    holds an error, a refusal, or prose that the evaluators would silently skip.
+    """
+    # Fresh client outputs are Python objects; stored cells are their string form
+    if isinstance(raw_value, (dict, list)):
+        raw_value = str(raw_value)
+    if pd.isna(raw_value):
+        return None
+
+    text = str(raw_value).strip()
+    if not text or "ERROR" in text:
+        return None
+
+    clean_text = re.sub(r'```[a-z]*\n?|```', '', text).strip()
+    for parse in (ast.literal_eval, json.loads):
+        try:
+            data = parse(clean_text)
+        except Exception:
+            continue
+        # The clients wrap unparseable responses as [text]
+        if isinstance(data, list) and all(isinstance(item, str) for item in data):
+            return None
+        if isinstance(data, (dict, list)) and len(data) > 0:
+            return data
+    return None
+
+def is_failed_prediction(raw_value, structured=True, output_schema=None):
+    """
+    Decides whether a stored prediction needs to be re-queried.
+    With structured=False (free-text prompts) only errors and missing cells count.
+    With an output_schema, parseable predictions must also conform to it.
+    """
+    if isinstance(raw_value, (dict, list)):
+        raw_value = str(raw_value)
+    if pd.isna(raw_value) or "ERROR" in str(raw_value):
+        return True
+    if not structured:
+        return False
+    data = parse_structured_prediction(raw_value)
+    if data is None:
+        return True
+    return output_schema is not None and not validate_output(data, output_schema)
@@ -0,0 +1,137 @@
+# utils/slice_store.py
+import os
+import uuid
+import tempfile
+import numpy as np
+from multiprocessing import shared_memory
+from PIL import Image
+
+class SharedSliceStore:
+    """
+    Zero-copy store for a stack of decoded 8-bit slices shared between processes.
+
+    The coordinator calls SharedSliceStore.create(paths) once: every slice is decoded a
+    single time into one (N, H, W) uint8 buffer backed by POSIX shared memory ("shm") or
+    an mmap'd file ("mmap"). Workers receive the small, picklable `spec` and call
+    SharedSliceStore.attach(spec) to get read-only NumPy views of the same pages; no
+    pixel data is copied or pickled.
+
+    Lifecycle: workers close() their handle; the coordinator (owner) unlinks the buffer,
+    which the context manager does automatically. Workers should be child processes of
+    the coordinator so they share its multiprocessing resource tracker.
+    """
+
+    def __init__(self, spec, buffer_handle, owner):
+        self.spec = spec
+        self.owner = owner
+        self._handle = buffer_handle
+        self._index = {key: i for i, key in enumerate(spec["keys"])}
+
+        if spec["backend"] == "shm":
+            self.stack = np.ndarray(spec["shape"], dtype=spec["dtype"], buffer=buffer_handle.buf)
+        else:
+            self.stack = buffer_handle
+        if not owner:
+            self.stack.flags.writeable = False
+
+    @classmethod
+    def create(cls, image_paths, backend="shm", mmap_dir=None):
+        """
+        Decodes every slice once into a new shared buffer (coordinator side).
+        All slices must have the same dimensions.
+        """
+        keys = [str(p) for p in dict.fromkeys(image_paths)]
+        with Image.open(keys[0]) as first:
+            width, height = first.size
+        shape = (len(keys), height, width)
+        nbytes = int(np.prod(shape))
+
+        if backend == "shm":
+            handle = shared_memory.SharedMemory(create=True, size=nbytes)
+            name = handle.name
+        elif backend == "mmap":
+            name = os.path.join(mmap_dir or tempfile.gettempdir(), f"slice_store_{uuid.uuid4().hex}.u8")
+            handle = np.memmap(name, dtype=np.uint8, mode="w+", shape=shape)
+        else:
+            raise ValueError(f"Unsupported backend '{backend}' (use 'shm' or 'mmap')")
+
+        spec = {"backend": backend, "name": name, "shape": shape, "dtype": "uint8", "keys": keys}
+        store = cls(spec, handle, owner=True)
+        try:
+            for i, path in enumerate(keys):
+                with Image.open(path) as img:
+                    store.stack[i] = np.asarray(img.convert("L"))
+        except Exception:
+            store.close()
+            store.unlink()
+            raise
+        return store
+
+    @classmethod
+    def attach(cls, spec):
+        """
+        Maps an existing store by name (worker side). Returns read-only views.
+        """
+        if spec["backend"] == "shm":
+            try:
+                # Python 3.13+: do not let this process's tracker unlink the owner's block
+                handle = shared_memory.SharedMemory(name=spec["name"], track=False)
+            except TypeError:
+                handle = shared_memory.SharedMemory(name=spec["name"])
+        else:
+            handle = np.memmap(spec["name"], dtype=spec["dtype"], mode="r", shape=tuple(spec["shape"]))
+        return cls(spec, handle, owner=False)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return str(key) in self._index
+
+    def index_of(self, key):
+        return self._index[str(key)]
+
+    def get(self, key):
+        """
+        Returns the (H, W) view for one slice path without copying.
+        """
+        return self.stack[self._index[str(key)]]
+
+    def close(self):
+        """
+        Releases this process's mapping. Drop every view returned by get() first;
+        a shared-memory block cannot be unmapped while NumPy views still reference it.
+        """
+        if self._handle is None:
+            return
+        self.stack = None
+        if self.spec["backend"] == "shm":
+            self._handle.close()
+        # np.memmap unmaps itself once the last reference is gone
+        self._handle = None
+
+    def unlink(self):
+        """
+        Destroys the shared buffer (owner only). Attached workers keep their mapping
+        until they close it, but no new process can attach afterwards.
+        """
+        if not self.owner:
+            raise RuntimeError("Only the coordinator that created the store can unlink it")
+        if self.spec["backend"] == "shm":
+            try:
+                block = shared_memory.SharedMemory(name=self.spec["name"])
+            except FileNotFoundError:
+                return
+            block.close()
+            block.unlink()
+        elif os.path.exists(self.spec["name"]):
+            os.remove(self.spec["name"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        if self.owner:
+            self.unlink()
+        return False
@@ -0,0 +1,47 @@
+# utils/slices.py
+import re
+import numpy as np
+from pathlib import Path
+
+def parse_z_index(image_ref):
+    """
+    Extracts the z-slice number from an image id or path such as 'z187' or '.../z187.png'.
+    Returns None if the name carries no z index.
+    """
+    match = re.search(r"z(\d+)", Path(str(image_ref)).stem)
+    return int(match.group(1)) if match else None
+
+def tomogram_key(row):
+    """
+    Identifies which tomogram a dataset row belongs to.
+    Uses an explicit 'tomogram_id' column when present, otherwise the image directory.
+    """
+    tomogram_id = row.get("tomogram_id")
+    if tomogram_id is not None and str(tomogram_id) != "nan":
+        return str(tomogram_id)
+    return str(Path(row["image_path"]).parent)
+
+def stratified_order(df, depth_bins=4, seed=0):
+    """
+    Returns the dataset's row labels in an order whose every prefix is spread across
+    tomograms and z-depth: rows are binned by tomogram and z-depth quantile, shuffled
+    within each bin, then drawn round-robin (bin order reshuffled every round).
+    """
+    rng = np.random.default_rng(seed)
+    tomograms = df.apply(tomogram_key, axis=1)
+    z_values = df["image_path"].apply(parse_z_index).astype(float)
+
+    cells = []
+    for _, labels in tomograms.groupby(tomograms).groups.items():
+        # Slices without a z index fall into the deepest bin
+        ranks = z_values.loc[labels].rank(method="first", na_option="bottom").astype(int) - 1
+        bins = ranks * depth_bins // len(labels)
+        for _, bin_labels in bins.groupby(bins).groups.items():
+            cells.append(rng.permutation(np.asarray(bin_labels)).tolist())
+
+    order = []
+    while cells:
+        for cell_index in rng.permutation(len(cells)):
+            order.append(cells[cell_index].pop())
+        cells = [cell for cell in cells if cell]
+    return order